@@ -1,17 +1,28 @@
 import streamlit as st
 from datetime import datetime
-import ollama
-import easyocr
 from PIL import Image
 import io
-import numpy as np
 
 # =========================
-# 📌 OCR SETUP (PaddleOCR)
-from paddleocr import PaddleOCR
-from pdf2image import convert_from_bytes
+# 📌 OCR SETUP (PaddleOCR, loaded lazily and shared by all sessions)
+import ocr_engines
+import ollama_client
+from blob_store import THUMB_WIDTH, get_blob_store
+from context_packer import NUM_CTX, ContextPacker
+from extraction_cache import cache_key, cached_extractor, content_digest, get_cache
+from model_warmup import get_warmer
+from ocr_preprocess import preprocess
+from response_cache import get_response_cache, make_key
+from session_budget import session_budget, usage_text
+from pdf_extract import iter_pdf_pages
+from transcript import load_older, older_label, window
 
-ocr = PaddleOCR(use_angle_cls=True, lang='en')
+
+@cached_extractor("paddleocr-image", version="2")
+def ocr_image_bytes(file_bytes):
+    # PaddleOCR's detector wants natural images: downscale and deskew, but don't binarize
+    image, _ = preprocess(Image.open(io.BytesIO(file_bytes)), binarize=False)
+    return ocr_engines.image_to_text("paddle", image)
 
 
 # =========================
@@ -80,13 +91,23 @@ st.markdown("""
 # =========================
 # 📌 AI RESPONSE FUNCTION
 # =========================
-def get_ai_response(prompt, model="tinydolphin"):
+def get_ai_response(prompt, model="tinydolphin", answer_key=None):
+    cache = get_response_cache()
+    cached = cache.get(answer_key) if answer_key else None
+    if cached is not None:
+        return cached
     try:
-        response = ollama.chat(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
+        timing = get_warmer().start(model)
+        response = ollama_client.chat(
+            model,
+            [{"role": "user", "content": prompt}],
+            options={"num_ctx": NUM_CTX}
         )
-        return response["message"]["content"]
+        timing.record_response(response)
+        answer = response["message"]["content"]
+        if answer_key and answer:
+            cache.put(answer_key, answer)
+        return answer
     except Exception as e:
         st.error(f"⚠️ Ollama se connect nahi ho pa raha: {e}")
         return None
@@ -102,6 +123,10 @@ if "current_chat_id" not in st.session_state:
     st.session_state.current_chat_id = 0
 if "last_extracted_text" not in st.session_state:
     st.session_state.last_extracted_text = None  # ✅ store OCR text
+if "last_upload_digest" not in st.session_state:
+    st.session_state.last_upload_digest = None  # upload already added to the chat
+# Saved chats' messages are held within a memory budget and spilled to disk when it is exceeded
+budget = session_budget(st.session_state)
 
 # =========================
 # 📌 SIDEBAR (Chat History)
@@ -116,11 +141,12 @@ if st.sidebar.button("➕ New Chat", use_container_width=True):
         st.session_state.chat_history.append({
             "id": st.session_state.current_chat_id,
             "title": chat_title,
-            "messages": st.session_state.messages.copy(),
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
         })
+        budget.put(f"chat:{st.session_state.current_chat_id}", st.session_state.messages.copy())
     st.session_state.messages = []
     st.session_state.last_extracted_text = None
+    st.session_state.last_upload_digest = None
     st.session_state.current_chat_id += 1
     st.rerun()
 
@@ -129,17 +155,32 @@ if st.session_state.chat_history:
     st.sidebar.subheader("Previous Chats")
     for chat in reversed(st.session_state.chat_history[-10:]):
         if st.sidebar.button(f"💬 {chat['title']}", key=f"chat_{chat['id']}", use_container_width=True):
-            st.session_state.messages = chat["messages"].copy()
+            st.session_state.messages = list(budget.get(f"chat:{chat['id']}", []))
             st.session_state.last_extracted_text = None
+            st.session_state.last_upload_digest = None
             st.rerun()
 
 # Clear All Chats
 if st.sidebar.button("🗑️ Clear All History", use_container_width=True):
     st.session_state.chat_history = []
+    budget.clear("chat:")
     st.session_state.messages = []
     st.session_state.last_extracted_text = None
+    st.session_state.last_upload_digest = None
     st.rerun()
 
+# OCR model status
+paddle_stats = ocr_engines.load_stats()["paddle"]
+if paddle_stats["loaded"]:
+    st.sidebar.caption(f"🔍 PaddleOCR loaded in {paddle_stats['load_seconds']:.1f}s")
+elif paddle_stats["error"]:
+    st.sidebar.caption(f"⚠️ PaddleOCR failed to load: {paddle_stats['error']}")
+else:
+    st.sidebar.caption("🔍 PaddleOCR loads on first upload")
+get_warmer().warm("tinydolphin", options={"num_ctx": NUM_CTX})
+st.sidebar.caption(get_warmer().status_text("tinydolphin"))
+st.sidebar.caption(usage_text(budget))
+
 # =========================
 # 📌 MAIN HEADER
 # =========================
@@ -149,11 +190,16 @@ st.markdown('<h1 class="main-header">🤖 AI Chatbot</h1>', unsafe_allow_html=Tr
 # 📌 DISPLAY CHAT MESSAGES
 # =========================
 with st.container():
-    for message in st.session_state.messages:
+    pages_key = f"transcript_pages:{st.session_state.current_chat_id}"
+    hidden, shown = window(st.session_state.messages, st.session_state.get(pages_key, 1))
+    if hidden:
+        st.button(older_label(hidden), key="load_older", on_click=load_older, args=(st.session_state, pages_key))
+    for message in shown:
         with st.chat_message(message["role"]):
             if message.get("type") == "image":
-                # ✅ Show smaller image (fixed width)
-                st.image(message["data"], caption=message.get("caption", "Uploaded Image"), width=300)
+                # ✅ Show smaller image: a cached thumbnail file, never the full upload
+                thumbnail = get_blob_store().thumbnail_path(message["blob"], THUMB_WIDTH)
+                st.image(thumbnail, caption=message.get("caption", "Uploaded Image"), width=THUMB_WIDTH)
             if "content" in message and message["content"]:
                 st.markdown(message["content"])
 
@@ -171,14 +217,17 @@ with st.container():
 # =========================
 # 📌 FILE HANDLING (Image / PDF)
 # =========================
-if uploaded_file is not None:
+upload_digest = content_digest(uploaded_file) if uploaded_file is not None else None
+if upload_digest is None:
+    # Uploader emptied: the same file uploaded again is a new upload
+    st.session_state.last_upload_digest = None
+if upload_digest is not None and upload_digest != st.session_state.last_upload_digest:
     file_bytes = uploaded_file.getvalue()
+    st.session_state.last_upload_digest = upload_digest
 
     # 🖼️ IMAGE OCR
     if uploaded_file.type.startswith('image/'):
-        image = Image.open(io.BytesIO(file_bytes))
-        result = ocr.ocr(np.array(image))
-        extracted_text = "\n".join([line[1][0] for line in result[0]]).strip()
+        extracted_text = ocr_image_bytes(file_bytes)
 
         if extracted_text:
             st.session_state.last_extracted_text = extracted_text
@@ -195,30 +244,42 @@ if uploaded_file is not None:
         st.session_state.messages.append({
             "role": "user",
             "type": "image",
-            "data": file_bytes,
+            "blob": get_blob_store().put(file_bytes),  # only the reference lives in the session
             "caption": uploaded_file.name
         })
 
     # 📄 PDF Handling
     elif uploaded_file.type == "application/pdf":
-        images = convert_from_bytes(file_bytes)
-        extracted_text_list = []
-        for img in images:
-            result = ocr.ocr(np.array(img))
-            extracted_text_list.extend([line[1][0] for line in result[0]])
-        extracted_text = "\n".join(extracted_text_list).strip()
+        pdf_cache_key = cache_key(upload_digest, "hybrid-pdf-paddle", "1")
+        extracted_text = get_cache().get(pdf_cache_key)
+        pdf_message = None
+
+        if extracted_text is None:
+            # Text-layer pages are instant; the rest are OCR'd in parallel and shown as they finish
+            pdf_message = {"role": "user", "content": "📄 PDF se text extract ho raha hai..."}
+            st.session_state.messages.append(pdf_message)
+            with st.chat_message("user"):
+                pdf_placeholder = st.empty()
+            page_texts = []
+            for page_number, total_pages, page_text, _ in iter_pdf_pages(file_bytes, ocr_engine="paddle"):
+                page_texts.append(page_text)
+                partial_text = "\n".join(page_texts).strip()
+                st.session_state.last_extracted_text = partial_text or None
+                pdf_message["content"] = f"📄 Extracted text from PDF (page {page_number}/{total_pages}):\n\n{partial_text[:2000]}..."
+                pdf_placeholder.markdown(pdf_message["content"])
+            extracted_text = "\n".join(page_texts).strip()
+            get_cache().put(pdf_cache_key, extracted_text)
 
         if extracted_text:
             st.session_state.last_extracted_text = extracted_text
-            st.session_state.messages.append({
-                "role": "user",
-                "content": f"📄 Extracted text from PDF:\n\n{extracted_text[:2000]}..."  # Limit preview
-            })
+            pdf_content = f"📄 Extracted text from PDF:\n\n{extracted_text[:2000]}..."  # Limit preview
         else:
-            st.session_state.messages.append({
-                "role": "user",
-                "content": "⚠️ PDF se text extract nahi ho paaya."
-            })
+            pdf_content = "⚠️ PDF se text extract nahi ho paaya."
+
+        if pdf_message is None:
+            st.session_state.messages.append({"role": "user", "content": pdf_content})
+        else:
+            pdf_message["content"] = pdf_content
 
 
 # =========================
@@ -227,7 +288,13 @@ if uploaded_file is not None:
 if prompt:
     # Merge OCR + Prompt if available
     if st.session_state.last_extracted_text:
-        final_prompt = f"Image se yeh text extract hua hai:\n\n{st.session_state.last_extracted_text}\n\nUser ka sawaal hai: {prompt}\n\nExtracted text aur question dono ko use karke jawab do."
+        # Trim the OCR text in tokens so the prompt fits the model's num_ctx
+        packed = ContextPacker(num_ctx=NUM_CTX).pack(
+            prompt,
+            documents=[("", st.session_state.last_extracted_text)],
+            overhead="Image se yeh text extract hua hai: User ka sawaal hai: Extracted text aur question dono ko use karke jawab do."
+        )
+        final_prompt = f"Image se yeh text extract hua hai:\n\n{packed.documents_text()}\n\nUser ka sawaal hai: {packed.question}\n\nExtracted text aur question dono ko use karke jawab do."
     else:
         final_prompt = prompt
 
@@ -238,7 +305,11 @@ if prompt:
     })
 
     # AI Response
-    response = get_ai_response(final_prompt, model="tinydolphin")
+    response = get_ai_response(
+        final_prompt,
+        model="tinydolphin",
+        answer_key=make_key("tinydolphin", prompt, st.session_state.last_extracted_text or "")
+    )
     if response:
         st.session_state.messages.append({
             "role": "assistant",
@@ -1,15 +1,26 @@
 import streamlit as st
-import json
 from datetime import datetime
-import requests
 import base64
 import time
+import math
 import re
+import uuid
 import subprocess
 import sys
-from PyPDF2 import PdfReader
 from pathlib import Path
 
+import ollama_client
+from extraction_cache import cached_extractor, content_digest
+from generation_registry import GenerationCancelled, get_registry
+from ingest import ingest
+from model_warmup import get_warmer
+from pdf_extract import extract_pdf_pages
+from response_cache import get_response_cache, make_key, replay
+from retrieval import BM25Index
+from session_budget import session_budget, usage_text
+from streaming import iter_in_thread
+from transcript import load_older, older_label, window
+
 # ----------------- AUTO-FIX FOR DOCX IMPORT -----------------
 try:
     from docx import Document
@@ -75,54 +86,84 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ----------------- OLLAMA CONFIG -----------------
-OLLAMA_URL = "http://localhost:11434/api/generate"
-
 # ----------------- STREAM RESPONSE -----------------
-def stream_response(prompt, context_text="", model="llava"):
-    try:
-        full_prompt = (
-            f"Use the following document context to answer questions accurately:\n\n"
-            f"{context_text}\n\nUser: {prompt}\n\nAssistant:"
-        ) if context_text else prompt
+def stream_response(prompt, context_text="", model="llava", cache_key=None, request_id=None):
+    parts = []
+    placeholder = st.empty()
 
-        payload = {"model": model, "prompt": full_prompt, "stream": True}
-        response = requests.post(OLLAMA_URL, json=payload, stream=True, timeout=120)
-        response.raise_for_status()
-
-        full_response = ""
-        placeholder = st.empty()
+    def render(chunks):
+        """Draw chunks as they arrive; False if the user pressed stop"""
         last_update = time.time()
-
-        for line in response.iter_lines(decode_unicode=True):
+        for chunk in chunks:
             if st.session_state.get("stop_generation", False):
-                break
-            if not line:
-                continue
-            try:
-                data = json.loads(line)
-                chunk = data.get("response", "")
-                full_response += chunk
-                if time.time() - last_update > 0.1:
-                    placeholder.markdown(full_response)
-                    last_update = time.time()
-            except json.JSONDecodeError:
-                pass
+                return False
+            parts.append(chunk)
+            if time.time() - last_update > 0.1:
+                placeholder.markdown("".join(parts))
+                last_update = time.time()
+        return True
 
+    try:
+        # A repeated question about the same files is replayed from the shared answer cache
+        cache = get_response_cache()
+        cached = cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            completed = render(replay(cached))
+        else:
+            full_prompt = (
+                f"Use the following document context to answer questions accurately:\n\n"
+                f"{context_text}\n\nUser: {prompt}\n\nAssistant:"
+            ) if context_text else prompt
+
+            payload = {"model": model, "prompt": full_prompt, "stream": True}
+            # Registered so the stop button can close the socket and Ollama aborts the generation
+            with get_registry().generation(request_id or str(uuid.uuid4())) as generation:
+                timing = get_warmer().start(model)
+
+                def produce():
+                    response = ollama_client.post("/api/generate", payload, stream=True)
+                    generation.attach(response)
+                    for data in ollama_client.iter_stream(response):
+                        timing.first_token()
+                        yield data.get("response", "")
+
+                try:
+                    # Read on a worker thread so a stop click reaches this script even while Ollama is prefilling
+                    completed = render(iter_in_thread(produce, idle=lambda: placeholder.markdown("".join(parts) or "…")))
+                except Exception:
+                    if not generation.cancelled:
+                        raise
+                    completed = False
+                finally:
+                    # Also runs when a rerun or stop interrupts the script mid-stream
+                    generation.cancel()
+
+        full_response = "".join(parts)
         placeholder.markdown(full_response)
+        if cache_key and cached is None and completed and full_response.strip():
+            cache.put(cache_key, full_response)
+        if not completed:
+            return full_response.strip() or "🛑 Generation stopped."
         return full_response.strip() or "⚠️ No response from Ollama."
+    except GenerationCancelled:
+        return "🛑 Generation stopped."
     except Exception as e:
         return f"⚠️ Error connecting to Ollama: {e}"
 
 # ----------------- FILE TEXT EXTRACTORS -----------------
+def is_extraction_error(text):
+    return text.startswith("⚠️")
+
+@cached_extractor("gaurang-hybrid-pdf-text", version="1", reject=is_extraction_error)
 def extract_text_from_pdf(uploaded_file):
     try:
-        reader = PdfReader(uploaded_file)
-        text = "".join(page.extract_text() or "" for page in reader.pages)
+        # Text layer first; only scanned or garbled pages go through Tesseract
+        text = "".join(extract_pdf_pages(uploaded_file, ocr_engine="tesseract"))
         return text.strip() or ""
     except Exception as e:
         return f"⚠️ Error reading PDF: {e}"
 
+@cached_extractor("python-docx", version="1", reject=is_extraction_error)
 def extract_text_from_docx(uploaded_file):
     try:
         doc = Document(uploaded_file)
@@ -130,29 +171,41 @@ def extract_text_from_docx(uploaded_file):
     except Exception as e:
         return f"⚠️ Error reading DOCX: {e}"
 
+@cached_extractor("utf8-text", version="1", reject=is_extraction_error)
 def extract_text_from_txt(uploaded_file):
     try:
         return uploaded_file.read().decode("utf-8", errors="ignore")
     except Exception as e:
         return f"⚠️ Error reading TXT: {e}"
 
+@cached_extractor("ollama-image-ocr", version="1", reject=is_extraction_error)
 def extract_text_from_image_ollama(uploaded_file, model="llava"):
     try:
         image_bytes = uploaded_file.getvalue()
         image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-        payload = {
-            "model": model,
-            "prompt": "You are an OCR assistant. Extract ONLY the text visible in this image.",
-            "images": [image_b64],
-            "stream": False
-        }
-        r = requests.post(OLLAMA_URL, json=payload, timeout=120)
-        r.raise_for_status()
-        data = r.json()
+        data = ollama_client.generate(
+            model,
+            "You are an OCR assistant. Extract ONLY the text visible in this image.",
+            images=[image_b64]
+        )
         return data.get("response", "").strip()
     except Exception as e:
         return f"⚠️ Error: {e}"
 
+DOCX_TYPES = ["application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
+
+def extract_file_text(file):
+    """Text of one upload; runs on an ingest thread, so no Streamlit calls here"""
+    if file.type == "application/pdf":
+        return extract_text_from_pdf(file)
+    elif file.type in DOCX_TYPES:
+        return extract_text_from_docx(file)
+    elif file.type.startswith("text/"):
+        return extract_text_from_txt(file)
+    elif file.type.startswith("image/"):
+        return extract_text_from_image_ollama(file)
+    return "⚠️ Unsupported file format."
+
 # ----------------- SESSION STATE -----------------
 defaults = {
     "messages": [],
@@ -160,17 +213,24 @@ defaults = {
     "current_chat_id": 0,
     "selected_model": "llava",
     "stop_generation": False,
+    "active_request_id": None,
     "pending_response": None,
-    "file_context": "",
     "uploaded_files": []
 }
 for k, v in defaults.items():
     if k not in st.session_state:
         st.session_state[k] = v
+# Saved chats and file text are held within a memory budget and spilled to disk when it is exceeded
+budget = session_budget(st.session_state)
+if "retrieval_index" not in st.session_state:
+    st.session_state.retrieval_index = BM25Index()
 
 # ----------------- SIDEBAR -----------------
 st.sidebar.title("⚙️ Settings")
 st.sidebar.success(f"✅ Active Model: {st.session_state.selected_model}")
+get_warmer().warm(st.session_state.selected_model)
+st.sidebar.caption(get_warmer().status_text(st.session_state.selected_model))
+st.sidebar.caption(usage_text(budget))
 st.sidebar.markdown("---")
 st.sidebar.title("💬 Chat History")
 
@@ -180,13 +240,13 @@ if st.sidebar.button("➕ New Chat", use_container_width=True):
         st.session_state.chat_history.append({
             "id": st.session_state.current_chat_id,
             "title": chat_title,
-            "messages": st.session_state.messages.copy(),
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
         })
+        budget.put(f"chat:{st.session_state.current_chat_id}", st.session_state.messages.copy())
     st.session_state.messages = []
     st.session_state.current_chat_id += 1
-    st.session_state.file_context = ""
     st.session_state.uploaded_files = []
+    st.session_state.retrieval_index = BM25Index()
     st.rerun()
 
 if st.sidebar.button("🗑 Clear All History", use_container_width=True):
@@ -194,25 +254,29 @@ if st.sidebar.button("🗑 Clear All History", use_container_width=True):
         "chat_history": [],
         "messages": [],
         "pending_response": None,
-        "file_context": "",
-        "uploaded_files": []
+        "uploaded_files": [],
+        "retrieval_index": BM25Index()
     })
+    budget.clear()
     st.rerun()
 
 if st.session_state.chat_history:
     st.sidebar.subheader("🕘 Previous Chats")
     for chat in reversed(st.session_state.chat_history[-10:]):
         if st.sidebar.button(f"💬 {chat['title']}", key=f"chat_{chat['id']}", use_container_width=True):
-            st.session_state.messages = chat["messages"].copy()
+            st.session_state.messages = list(budget.get(f"chat:{chat['id']}", []))
             st.session_state.pending_response = None
-            st.session_state.file_context = ""
             st.rerun()
 
 # ----------------- MAIN HEADER -----------------
 st.markdown('<h1 class="main-header">Samvaad Guru 📚 </h1>', unsafe_allow_html=True)
 
 # ----------------- CHAT DISPLAY -----------------
-for msg in st.session_state.messages:
+pages_key = f"transcript_pages:{st.session_state.current_chat_id}"
+hidden, shown = window(st.session_state.messages, st.session_state.get(pages_key, 1))
+if hidden:
+    st.button(older_label(hidden), key="load_older", on_click=load_older, args=(st.session_state, pages_key))
+for msg in shown:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
@@ -249,51 +313,75 @@ def get_file_icon(file_name: str):
 
 # ----------------- FILE PREVIEW SECTION -----------------
 if uploaded_files:
-    all_texts = []
+    indexed_docs = set()
     st.markdown("<br>", unsafe_allow_html=True)
 
-    for file in uploaded_files:
+    # Extract every file concurrently; texts come back in upload order
+    progress = st.progress(0.0, text=f"Reading {len(uploaded_files)} file(s)...")
+
+    def report(index, file, text, done, total):
+        progress.progress(done / total, text=f"Read {file.name} ({done}/{total})")
+
+    texts = ingest(uploaded_files, extract_file_text, on_progress=report)
+    progress.empty()
+
+    for file, text in zip(uploaded_files, texts):
         icon = get_file_icon(file.name)
         file_type = file.type
         file_bytes = file.getvalue()
+        digest = content_digest(file_bytes)
 
         with st.expander(f"{icon} {file.name}"):
             if file_type == "application/pdf":
-                # PDF Preview
-                pdf_base64 = base64.b64encode(file_bytes).decode("utf-8")
-                pdf_display = f'<iframe src="data:application/pdf;base64,{pdf_base64}" width="100%" height="500px"></iframe>'
-                st.markdown(pdf_display, unsafe_allow_html=True)
-                text = extract_text_from_pdf(file)
-
-            elif file_type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-                text = extract_text_from_docx(file)
+                # PDF Preview: a few low-res page thumbnails, rendered on demand and cached by file hash
+                if st.toggle("Show page previews", key=f"preview_{digest}"):
+                    try:
+                        # Imported here: pdf2image is only needed once someone opens a preview
+                        from pdf_preview import THUMBS_PER_SHEET, get_thumbnail_cache
+                        thumbs = get_thumbnail_cache()
+                        sheets = max(1, math.ceil(thumbs.page_count(digest, file_bytes) / THUMBS_PER_SHEET))
+                        sheet = 1
+                        if sheets > 1:
+                            sheet = st.number_input(f"Pages (1–{sheets})", 1, sheets, key=f"sheet_{digest}")
+                        columns = st.columns(THUMBS_PER_SHEET)
+                        for column, (page, jpeg) in zip(columns, thumbs.sheet(digest, file_bytes, sheet)):
+                            column.image(jpeg, caption=f"Page {page}", use_container_width=True)
+                    except Exception as e:
+                        st.caption(f"⚠️ Preview unavailable: {e}")
+
+            elif file_type in DOCX_TYPES:
                 st.text_area("📘 DOCX Preview", text[:2000], height=200)
 
             elif file_type.startswith("text/"):
-                text = extract_text_from_txt(file)
                 st.text_area("📄 Text Preview", text[:2000], height=200)
 
             elif file_type.startswith("image/"):
                 st.image(file_bytes, caption=file.name, use_container_width=True)
-                text = extract_text_from_image_ollama(file)
 
-            else:
-                text = "⚠️ Unsupported file format."
+        # Chunk + index each upload once; later reruns only touch new or removed files
+        doc_id = f"{file.name}:{digest}"
+        indexed_docs.add(doc_id)
+        if doc_id not in st.session_state.retrieval_index and not is_extraction_error(text):
+            st.session_state.retrieval_index.add_document(doc_id, text, source=file.name)
 
-        all_texts.append(f"--- FILE: {file.name} ---\n{text}\n")
+    for doc_id in list(st.session_state.retrieval_index.doc_chunks):
+        if doc_id not in indexed_docs:
+            st.session_state.retrieval_index.remove_document(doc_id)
 
-    st.session_state.file_context = "\n".join(all_texts)
     st.session_state.uploaded_files = [f.name for f in uploaded_files]
     st.toast(f"✅ Loaded {len(uploaded_files)} file(s): " + ", ".join(st.session_state.uploaded_files))
 
 # ----------------- CHAT FUNCTIONALITY -----------------
 if stop_clicked:
     st.session_state.stop_generation = True
+    if st.session_state.active_request_id:
+        get_registry().cancel(st.session_state.active_request_id)
 
 if prompt:
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.session_state.stop_generation = False
     st.session_state.pending_response = None
+    st.session_state.active_request_id = str(uuid.uuid4())
     st.rerun()
 
 if (
@@ -303,12 +391,23 @@ if (
 ):
     user_prompt = st.session_state.messages[-1]["content"]
     with st.chat_message("assistant"):
-        with st.spinner(f"Thinking with {st.session_state.selected_model}..."):
-            result = stream_response(
-                user_prompt,
-                context_text=st.session_state.file_context,
-                model=st.session_state.selected_model
-            )
+        if st.session_state.stop_generation:
+            # Stopped before an answer was recorded; don't start the generation again
+            result = "🛑 Generation stopped."
+        else:
+            with st.spinner(f"Thinking with {st.session_state.selected_model}..."):
+                # Only the chunks most relevant to this question go into the prompt
+                result = stream_response(
+                    user_prompt,
+                    context_text=st.session_state.retrieval_index.context_for(user_prompt),
+                    model=st.session_state.selected_model,
+                    cache_key=make_key(
+                        st.session_state.selected_model,
+                        user_prompt,
+                        "\n".join(sorted(st.session_state.retrieval_index.doc_chunks))
+                    ),
+                    request_id=st.session_state.active_request_id
+                )
         st.session_state.pending_response = result
         st.session_state.messages.append({"role": "assistant", "content": result})
         st.rerun()
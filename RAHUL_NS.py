@@ -1,14 +1,24 @@
 import streamlit as st
 from PIL import Image
 import pytesseract
-from PyPDF2 import PdfReader
 from textblob import TextBlob
 import requests
-import json
-import time
 from datetime import datetime
 import os
 
+import ocr_engines
+import ollama_client
+from context_packer import NUM_CTX, ContextPacker
+from extraction_cache import cached_extractor
+from model_warmup import get_warmer
+from ocr_preprocess import preprocess
+from pdf_extract import extract_pdf_pages
+from response_cache import context_hash, get_response_cache, make_key, replay
+from session_budget import session_budget, usage_text
+from streaming import FrameCoalescer
+from transcript import load_older, older_label, window
+from vector_index import build_index
+
 # -----------------------------------------------------------
 # 🎨 Custom CSS for Modern UI
 # -----------------------------------------------------------
@@ -120,6 +130,9 @@ with st.sidebar:
         ["llama3", "llama3:8b", "llama3:70b"],
         help="Select the model size for better responses"
     )
+    # Preload the chosen model in the background so the first question doesn't wait for it
+    get_warmer().warm(model, options={"num_ctx": NUM_CTX})
+    st.caption(get_warmer().status_text(model))
     st.divider()
     st.info("💡 **How to use:**\n1. Upload an image/PDF\n2. Ask questions\n3. Download full report!")
     st.markdown("### 🌟 Pro Tips\n- Use clear images for better OCR\n- Ask specific questions\n- Try 'Summarize this' or 'Explain key points'")
@@ -159,63 +172,70 @@ def analyze_sentiment(text):
     else: 
         return "neutral", "😐"
 
+@cached_extractor("rahul-tesseract-image", version="3", reject=lambda text: text.startswith("⚠️"))
 def extract_text_from_image(uploaded_image):
     try:
-        img = Image.open(uploaded_image)
-        text = pytesseract.image_to_string(img).strip()
+        img, _ = preprocess(Image.open(uploaded_image))
+        text = ocr_engines.image_to_text("tesseract", img)
         return text if text else "⚠️ No text detected in image"
     except Exception as e:
         return f"⚠️ OCR failed: {str(e)}"
 
+@cached_extractor("hybrid-pdf-pages", version="1", reject=lambda text: text.startswith("⚠️"))
 def extract_text_from_pdf(uploaded_pdf):
     try:
-        pdf_reader = PdfReader(uploaded_pdf)
+        # Text layer first; only scanned or garbled pages go through Tesseract
         text = ""
-        for i, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
+        for i, page_text in enumerate(extract_pdf_pages(uploaded_pdf, ocr_engine="tesseract")):
             if page_text:
                 text += f"\n--- Page {i+1} ---\n{page_text}"
         return text.strip() if text else "⚠️ No text found in PDF"
     except Exception as e:
         return f"⚠️ PDF reading failed: {str(e)}"
 
-def ask_llama3(prompt, model):
+def ask_llama3(prompt, model, cache_key=None):
+    """Yield the reply as deltas (new text only), not the whole reply so far"""
+    # Repeat questions about the same document are replayed from the shared answer cache
+    cache = get_response_cache()
+    cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        yield from replay(cached)
+        return
+
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model, "prompt": prompt, "stream": True},
-            stream=True,
-            timeout=120
+        timing = get_warmer().start(model)
+        response = ollama_client.post(
+            "/api/generate",
+            {"model": model, "prompt": prompt, "stream": True, "options": {"num_ctx": NUM_CTX}},
+            stream=True
         )
-        response.raise_for_status()
         
-        full_reply = ""
-        for chunk in response.iter_lines():
-            if chunk:
-                try:
-                    decoded = chunk.decode("utf-8", errors="ignore")
-                    data = json.loads(decoded)
-                    if "response" in data:
-                        full_reply += data["response"]
-                        yield full_reply
-                    if data.get("done"):
-                        break
-                except (json.JSONDecodeError, UnicodeDecodeError):
-                    continue
+        parts = []
+        for data in ollama_client.iter_stream(response):
+            if "response" in data:
+                timing.first_token()
+                parts.append(data["response"])
+                yield data["response"]
+            if data.get("done"):
+                full_reply = "".join(parts)
+                if cache_key and full_reply.strip():
+                    cache.put(cache_key, full_reply)
+                break
     except requests.exceptions.RequestException as e:
-        yield f"❌ Connection error: {str(e)}"
+        yield f"\n\n❌ Connection error: {str(e)}"
     except Exception as e:
-        yield f"❌ Unexpected error: {str(e)}"
+        yield f"\n\n❌ Unexpected error: {str(e)}"
 
 def generate_report():
     report = []
     
     # Document content
-    if st.session_state.context_text and "⚠️" not in st.session_state.context_text:
+    context_text = budget.get("context_text", "")
+    if context_text and "⚠️" not in context_text:
         report.append("="*60)
         report.append("DOCUMENT CONTENT")
         report.append("="*60)
-        report.append(st.session_state.context_text)
+        report.append(context_text)
         report.append("\n" + "="*60 + "\n")
     
     # Sentiment
@@ -243,8 +263,12 @@ def generate_report():
 # -----------------------------------------------------------
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "context_text" not in st.session_state:
-    st.session_state.context_text = ""
+# The document text is held within a memory budget and spilled to disk when it is exceeded
+budget = session_budget(st.session_state)
+st.sidebar.caption(usage_text(budget))
+if "vector_index" not in st.session_state:
+    st.session_state.vector_index = None
+    st.session_state.vector_index_source = None
 if "sentiment" not in st.session_state:
     st.session_state.sentiment = ("neutral", "😐")
 if "show_full_text" not in st.session_state:
@@ -272,19 +296,26 @@ if uploaded_file:
             extracted_text = extract_text_from_pdf(uploaded_file)
         
         if "⚠️" not in extracted_text:
-            st.session_state.context_text = extracted_text
+            budget.put("context_text", extracted_text)
+            # Embed the document's chunks once per new document, not on every rerun
+            if st.session_state.vector_index_source != context_hash(extracted_text):
+                st.session_state.vector_index = build_index(extracted_text)
+                st.session_state.vector_index_source = context_hash(extracted_text)
             sentiment, emoji = analyze_sentiment(extracted_text)
             st.session_state.sentiment = (sentiment, emoji)
             st.success(f"✅ Successfully processed {file_type}")
         else:
             st.error(extracted_text)
-            st.session_state.context_text = ""
+            budget.pop("context_text")
+            st.session_state.vector_index = None
+            st.session_state.vector_index_source = None
 
 # -----------------------------------------------------------
 # 📜 Display Document Controls
 # -----------------------------------------------------------
-if st.session_state.context_text and "⚠️" not in st.session_state.context_text:
-    preview = st.session_state.context_text[:1500] + "..." if len(st.session_state.context_text) > 1500 else st.session_state.context_text
+context_text = budget.get("context_text", "")
+if context_text and "⚠️" not in context_text:
+    preview = context_text[:1500] + "..." if len(context_text) > 1500 else context_text
     st.text_area("📜 Document Preview", preview, height=200, key="preview_area")
     
     sentiment, emoji = st.session_state.sentiment
@@ -317,7 +348,7 @@ if st.session_state.context_text and "⚠️" not in st.session_state.context_te
         st.markdown("### 📄 Full Extracted Text")
         st.text_area(
             "", 
-            st.session_state.context_text, 
+            context_text, 
             height=500,
             key="full_text_display"
         )
@@ -326,7 +357,10 @@ if st.session_state.context_text and "⚠️" not in st.session_state.context_te
 # -----------------------------------------------------------
 # 💬 Display Chat History — FIXED SYNTAX
 # -----------------------------------------------------------
-for msg in st.session_state.messages:
+hidden, shown = window(st.session_state.messages, st.session_state.get("transcript_pages", 1))
+if hidden:
+    st.button(older_label(hidden), key="load_older", on_click=load_older, args=(st.session_state, "transcript_pages"))
+for msg in shown:
     with st.chat_message(msg["role"]):  # ✅ CORRECTED: Added missing parenthesis
         st.markdown(msg["content"])
 
@@ -338,19 +372,37 @@ if prompt := st.chat_input("💬 Ask anything about your document..."):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Build context-aware prompt
-    if st.session_state.context_text and "⚠️" not in st.session_state.context_text:
+    # Build context-aware prompt, sized in tokens to fit the model's num_ctx
+    packer = ContextPacker(num_ctx=NUM_CTX)
+    history = st.session_state.messages[:-1]
+    if context_text and "⚠️" not in context_text:
         sentiment, _ = st.session_state.sentiment
-        # Truncate to fit Llama3 context window
-        context_snippet = st.session_state.context_text[:8000]
+        # Send only the chunks most relevant to the question, from anywhere in the document
+        context_snippet = context_text
+        if st.session_state.vector_index is not None:
+            try:
+                context_snippet = st.session_state.vector_index.context_for(prompt)
+            except requests.exceptions.RequestException:
+                pass  # embeddings unavailable: fall back to the whole document
+        intro = f"You are an expert document analyst. The following document has a {sentiment} sentiment.\n\n"
+        rules = "Answer concisely and accurately based ONLY on the document above. If the question cannot be answered from the document, say 'I cannot answer that based on the provided document.'"
+        packed = packer.pack(prompt, documents=[("", context_snippet)], history=history, overhead=intro + rules)
+        conversation = f"Conversation so far:\n{packed.history_text()}\n\n" if packed.history else ""
         full_prompt = (
-            f"You are an expert document analyst. The following document has a {sentiment} sentiment.\n\n"
-            f"Document:\n{context_snippet}\n\n"
-            f"User Question: {prompt}\n\n"
-            f"Answer concisely and accurately based ONLY on the document above. If the question cannot be answered from the document, say 'I cannot answer that based on the provided document.'"
+            f"{intro}"
+            f"Document:\n{packed.documents_text()}\n\n"
+            f"{conversation}"
+            f"User Question: {packed.question}\n\n"
+            f"{rules}"
         )
     else:
-        full_prompt = f"Answer this general question: {prompt}"
+        packed = packer.pack(prompt, history=history, overhead="Answer this general question: ")
+        conversation = f"Conversation so far:\n{packed.history_text()}\n\n" if packed.history else ""
+        full_prompt = f"{conversation}Answer this general question: {packed.question}"
+    # Same model + question + document (+ conversation so far) => same cached answer
+    answer_key = make_key(model, prompt, context_text + "\0" + packed.history_text())
+    st.caption(f"📦 Prompt packed to ~{packed.tokens['total']} of {NUM_CTX} tokens"
+               + (" (trimmed to fit)" if packed.truncated else ""))
     
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
@@ -362,15 +414,13 @@ if prompt := st.chat_input("💬 Ask anything about your document..."):
             unsafe_allow_html=True
         )
         
-        full_response = ""
-        for partial_response in ask_llama3(full_prompt, model):
-            full_response = partial_response
-            # Update in real-time
-            message_placeholder.markdown(full_response + " 🤖")
-            time.sleep(0.01)  # Smooth streaming
+        # Redraw at a fixed frame rate instead of once per token
+        coalescer = FrameCoalescer(lambda text: message_placeholder.markdown(text + " 🤖"))
+        for delta in ask_llama3(full_prompt, model, cache_key=answer_key):
+            coalescer.push(delta)
         
         # Final update
-        message_placeholder.markdown(full_response + " 🤖")
+        full_response = coalescer.finish().strip()
     
     st.session_state.messages.append({"role": "assistant", "content": full_response})
 
@@ -10,10 +10,19 @@ import pytesseract
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 from PIL import Image
-import ollama
+
+import ocr_engines
+from chat_store import ChatStore
+from context_packer import ANSWER_RESERVE, NUM_CTX, ContextPacker
+from extraction_cache import cached_extractor
+from model_warmup import get_warmer
+from ocr_preprocess import preprocess
+from ollama_dispatch import QueueFullError, submit_generate
+from transcript import load_older, older_label, window
 
 # ===================== CONFIG =====================
-CHAT_FILE = "chats.json"
+CHAT_FILE = "chats.json"  # legacy single-file store, migrated per user on first login
+CHAT_DIR = "chats"
 USER_FILE = "users.json"
 MODEL_NAME = "llama3.2"  # Change if you want another Ollama model
 
@@ -24,19 +33,25 @@ def init_session_state():
     if "current_user" not in st.session_state:
         st.session_state.current_user = None
     if "chats" not in st.session_state:
-        st.session_state.chats = load_chats()
+        st.session_state.chats = {}  # chat index of the logged-in user only
+    if "chat_messages" not in st.session_state:
+        st.session_state.chat_messages = {}  # messages of chats opened this session
     if "current_chat" not in st.session_state:
         st.session_state.current_chat = None
 
-def load_chats():
-    if os.path.exists(CHAT_FILE):
-        with open(CHAT_FILE, "r") as f:
-            return json.load(f)
-    return {}
+@st.cache_resource
+def get_chat_store():
+    return ChatStore(root=CHAT_DIR, legacy_file=CHAT_FILE)
 
-def save_chats(chats):
-    with open(CHAT_FILE, "w") as f:
-        json.dump(chats, f, indent=2)
+def load_chats(user):
+    return get_chat_store().load_index(user)
+
+def get_chat_messages(chat_id):
+    messages = st.session_state.chat_messages.get(chat_id)
+    if messages is None:
+        messages = get_chat_store().load_messages(st.session_state.current_user, chat_id)
+        st.session_state.chat_messages[chat_id] = messages
+    return messages
 
 def load_users():
     if os.path.exists(USER_FILE):
@@ -72,6 +87,8 @@ def log_in(username, password):
         return False, "Incorrect password"
     st.session_state.authenticated = True
     st.session_state.current_user = username
+    st.session_state.chats = load_chats(username)
+    st.session_state.chat_messages = {}
     return True, "Login successful"
 
 # ===================== CHAT MANAGEMENT =====================
@@ -81,52 +98,100 @@ def generate_chat_id():
 def create_new_chat(title="New Chat"):
     user = st.session_state.current_user
     chat_id = generate_chat_id()
-    if user not in st.session_state.chats:
-        st.session_state.chats[user] = {}
-    st.session_state.chats[user][chat_id] = {
+    meta = {
         "title": title,
         "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat(),
-        "messages": []
+        "updated_at": datetime.now().isoformat()
     }
-    save_chats(st.session_state.chats)
+    st.session_state.chats[chat_id] = meta
+    st.session_state.chat_messages[chat_id] = []
+    get_chat_store().create_chat(user, chat_id, meta)
     return chat_id
 
 def delete_chat(chat_id):
     user = st.session_state.current_user
-    if user in st.session_state.chats and chat_id in st.session_state.chats[user]:
-        del st.session_state.chats[user][chat_id]
-        save_chats(st.session_state.chats)
+    if chat_id in st.session_state.chats:
+        del st.session_state.chats[chat_id]
+        st.session_state.chat_messages.pop(chat_id, None)
+        get_chat_store().delete_chat(user, chat_id)
         return True
     return False
 
 def add_message_to_chat(chat_id, role, content):
     user = st.session_state.current_user
-    chat = st.session_state.chats[user][chat_id]
-    chat["messages"].append({
+    meta = st.session_state.chats[chat_id]
+    message = {
         "role": role,
         "content": content,
         "timestamp": datetime.now().isoformat()
-    })
-    chat["updated_at"] = datetime.now().isoformat()
-    save_chats(st.session_state.chats)
+    }
+    get_chat_messages(chat_id).append(message)
+    meta["updated_at"] = message["timestamp"]
+    get_chat_store().append_message(user, chat_id, meta, message)
 
 # ===================== OCR FUNCTION =====================
+@cached_extractor("yadnyesh-tesseract-image", version="3")
 def extract_text_from_image(image_file):
-    image = Image.open(image_file)
-    text = pytesseract.image_to_string(image)
-    return text.strip()
+    image, _ = preprocess(Image.open(image_file))
+    return ocr_engines.image_to_text("tesseract", image)
 
 # ===================== OLLAMA AI =====================
-def generate_ai_response(prompt):
+def build_turn(chat_id, prompt):
+    """Prompt and request fields for the next turn of a chat.
+
+    The model state saved after the previous turn is reused when it covers
+    exactly the messages before `prompt`, so only the new message is
+    prefilled. Otherwise (first turn, missing or stale state, model changed,
+    context nearly full) the history is re-sent, packed into the token budget,
+    and the returned state replaces the old one.
+    """
+    history = get_chat_messages(chat_id)[:-1]
+    state = get_chat_store().load_context(st.session_state.current_user, chat_id)
+    if (
+        state
+        and state.get("model") == MODEL_NAME
+        and state.get("messages") == len(history)
+        and len(state.get("context") or []) < NUM_CTX - ANSWER_RESERVE
+    ):
+        return prompt, {"context": state["context"]}
+    if not history:
+        return prompt, {}
+    packed = ContextPacker(num_ctx=NUM_CTX).pack(prompt, history=history, overhead="Conversation so far:")
+    return f"Conversation so far:\n{packed.history_text()}\n\nUser: {prompt}", {}
+
+def generate_ai_response(chat_id, prompt):
+    user = st.session_state.current_user
+    turn_prompt, fields = build_turn(chat_id, prompt)
+    # Requests go through the shared dispatcher: bounded concurrency, fair across users
+    timing = get_warmer().start(MODEL_NAME)
+    try:
+        ticket = submit_generate(user, MODEL_NAME, turn_prompt, options={"num_ctx": NUM_CTX}, **fields)
+    except QueueFullError as e:
+        return f"⏳ {e}"
+
+    status = st.empty()
+    try:
+        while not ticket.wait(timeout=0.25):
+            position = ticket.position()
+            if position:
+                status.info(f"⏳ Waiting for a free slot — you are #{position} in the queue")
+            else:
+                status.empty()
+    finally:
+        ticket.cancel()  # no-op once started; frees the queue spot if this run is interrupted
+    status.empty()
+
     try:
-        response = ollama.chat(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response['message']['content']
+        response = ticket.result()
+        reply = response['response']
+        timing.record_response(response)
     except Exception as e:
         return f"Error contacting Ollama: {e}"
+    if response.get("context"):
+        # Covers the history, this prompt and the reply about to be appended
+        message_count = len(get_chat_messages(chat_id)) + 1
+        get_chat_store().save_context(user, chat_id, MODEL_NAME, message_count, response["context"])
+    return reply
 
 # ===================== STREAMLIT UI =====================
 init_session_state()
@@ -135,6 +200,9 @@ st.set_page_config(page_title="Chatbot with OCR & Ollama", page_icon="🤖", lay
 
 with st.sidebar:
     st.title("🤖 Chatbot with OCR + Ollama")
+    # Load the model while the user logs in, so the first answer doesn't pay for it
+    get_warmer().warm(MODEL_NAME, options={"num_ctx": NUM_CTX})
+    st.caption(get_warmer().status_text(MODEL_NAME))
 
     if not st.session_state.authenticated:
         tab1, tab2 = st.tabs(["Login", "Sign Up"])
@@ -175,7 +243,7 @@ with st.sidebar:
             st.rerun()
 
         # Show chats
-        user_chats = st.session_state.chats.get(st.session_state.current_user, {})
+        user_chats = st.session_state.chats
         for cid, chat in sorted(user_chats.items(), key=lambda x: x[1]["updated_at"], reverse=True):
             if st.button(chat["title"], key=cid):
                 st.session_state.current_chat = cid
@@ -185,14 +253,21 @@ with st.sidebar:
         if st.button("Logout"):
             st.session_state.authenticated = False
             st.session_state.current_user = None
+            st.session_state.chats = {}
+            st.session_state.chat_messages = {}
+            st.session_state.current_chat = None
             st.rerun()
 
 if st.session_state.authenticated:
     if st.session_state.current_chat:
-        chat = st.session_state.chats[st.session_state.current_user][st.session_state.current_chat]
+        chat = st.session_state.chats[st.session_state.current_chat]
         st.header(chat["title"])
 
-        for msg in chat["messages"]:
+        pages_key = f"transcript_pages:{st.session_state.current_chat}"
+        hidden, shown = window(get_chat_messages(st.session_state.current_chat), st.session_state.get(pages_key, 1))
+        if hidden:
+            st.button(older_label(hidden), key="load_older", on_click=load_older, args=(st.session_state, pages_key))
+        for msg in shown:
             with st.chat_message(msg["role"]):
                 st.markdown(msg["content"])
 
@@ -208,7 +283,7 @@ if st.session_state.authenticated:
         if user_input:
             add_message_to_chat(st.session_state.current_chat, "user", user_input)
             with st.spinner("Thinking..."):
-                reply = generate_ai_response(user_input)
+                reply = generate_ai_response(st.session_state.current_chat, user_input)
             add_message_to_chat(st.session_state.current_chat, "assistant", reply)
             st.rerun()
 
@@ -0,0 +1,88 @@
+"""Content-addressed store for uploaded images.
+
+Chat messages keep only a reference ({"type": "image", "blob": <sha256>})
+instead of the raw upload bytes, so session state, chat_history copies and
+reruns stay small however many images a user sends. The original is written
+once to disk under its hash, and a thumbnail at display size is generated on
+first use and cached next to it; the UI renders the thumbnail's path, so the
+full-size bytes are never held in the session or sent to the browser.
+
+Layout on disk:
+
+    .blobs/<ab>/<sha256>                 original bytes
+    .blobs/thumbs/<ab>/<sha256>-w<N>.jpg thumbnail, N pixels wide (.png if transparent)
+"""
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+# -------------------- CONFIG --------------------
+BLOB_DIR = ".blobs"
+THUMB_WIDTH = 300
+JPEG_QUALITY = 80
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """Store bytes once and return their sha256 reference"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        return digest
+
+    def get(self, digest):
+        with open(self.path(digest), "rb") as f:
+            return f.read()
+
+    def thumbnail_path(self, digest, width=THUMB_WIDTH):
+        """Path of a `width`-pixel-wide thumbnail of an image blob, made on first request"""
+        thumbs = os.path.join(self.root, "thumbs", digest[:2])
+        for ext in ("jpg", "png"):
+            path = os.path.join(thumbs, f"{digest}-w{width}.{ext}")
+            if os.path.exists(path):
+                return path
+        with self._lock:
+            with Image.open(self.path(digest)) as image:
+                image.thumbnail((width, width * 4))
+                transparent = image.mode in ("RGBA", "LA") or "transparency" in image.info
+                ext = "png" if transparent else "jpg"
+                path = os.path.join(thumbs, f"{digest}-w{width}.{ext}")
+                os.makedirs(thumbs, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                if transparent:
+                    image.save(tmp_path, format="PNG")
+                else:
+                    image.convert("RGB").save(tmp_path, format="JPEG", quality=JPEG_QUALITY)
+                os.replace(tmp_path, path)
+        return path
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Process-wide store shared by every session"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
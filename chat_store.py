@@ -0,0 +1,299 @@
+"""Per-user sharded chat storage used by Yadnyesh_Kumbhar.py.
+
+Layout on disk:
+
+    chats/<user-shard>/index.json       chat_id -> title / created_at / updated_at
+    chats/<user-shard>/<chat_id>.json   {"messages": [...], "seq": N}  (snapshot)
+    chats/<user-shard>/<chat_id>.log    one JSON record per appended message
+    chats/<user-shard>/<chat_id>.ctx    model state (Ollama context tokens) after the last turn
+
+A login only reads the user's index, a chat's messages are only read when the
+chat is opened, and a write only touches the chat that changed. New messages
+are appended to the chat's journal in O(1) and fsynced in batches; a
+background thread folds journals back into their snapshot once they grow past
+COMPACT_BYTES. Loading a chat replays whatever the journal holds beyond the
+snapshot, which is also how a crash is recovered from.
+
+The .ctx file lets the next turn continue from the model's evaluated state
+instead of re-sending the whole conversation. It records how many messages it
+covers, so a caller can tell when it is stale and rebuild it.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+
+# ===================== CONFIG =====================
+CHAT_DIR = "chats"
+LEGACY_CHAT_FILE = "chats.json"
+FSYNC_BATCH = 16          # fsync a journal after this many appends ...
+FSYNC_INTERVAL = 1.0      # ... or after this many seconds, whichever comes first
+COMPACT_BYTES = 256 * 1024
+
+
+# ===================== HELPERS =====================
+def _write_json(path, data):
+    """Atomically replace `path` with the JSON encoding of `data`"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _read_log(path):
+    """Yield journal records, skipping a torn last line left by a crash"""
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+# ===================== JOURNAL =====================
+class _Journal:
+    """Open append handle and sequence counter for one chat's log"""
+
+    def __init__(self, path, seq):
+        self.path = path
+        self.seq = seq
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+        self.fh = open(path, "a")
+        self.size = self.fh.tell()
+        self.pending = 0
+
+    def sync(self):
+        if self.pending:
+            self.fh.flush()
+            os.fsync(self.fh.fileno())
+            self.pending = 0
+
+    def close(self):
+        self.sync()
+        self.fh.close()
+
+
+# ===================== STORE =====================
+class ChatStore:
+    def __init__(self, root=CHAT_DIR, legacy_file=LEGACY_CHAT_FILE, background=True):
+        self.root = root
+        self.legacy_file = legacy_file
+        self._lock = threading.Lock()
+        self._journals = {}     # (user, chat_id) -> _Journal
+        self._dirty_meta = {}   # user -> {chat_id: meta} not yet written to index.json
+        self._stop = threading.Event()
+        os.makedirs(root, exist_ok=True)
+        if background:
+            threading.Thread(target=self._flush_loop, name="chat-journal", daemon=True).start()
+        atexit.register(self.close)
+
+    def user_dir(self, user):
+        shard = hashlib.sha256(user.encode()).hexdigest()[:16]
+        return os.path.join(self.root, shard)
+
+    def _index_path(self, user):
+        return os.path.join(self.user_dir(user), "index.json")
+
+    def _chat_path(self, user, chat_id):
+        return os.path.join(self.user_dir(user), f"{chat_id}.json")
+
+    def _log_path(self, user, chat_id):
+        return os.path.join(self.user_dir(user), f"{chat_id}.log")
+
+    def _context_path(self, user, chat_id):
+        return os.path.join(self.user_dir(user), f"{chat_id}.ctx")
+
+    def _ensure_user(self, user):
+        path = self.user_dir(user)
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            self._migrate_legacy(user)
+        return path
+
+    def _migrate_legacy(self, user):
+        """Copy one user's chats out of the old single chats.json file"""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        legacy = _read_json(self.legacy_file, {}).get(user, {})
+        index = {}
+        for chat_id, chat in legacy.items():
+            _write_json(self._chat_path(user, chat_id), {"messages": chat.get("messages", [])})
+            index[chat_id] = {k: v for k, v in chat.items() if k != "messages"}
+        if index:
+            _write_json(self._index_path(user), index)
+
+    # ---------- reads ----------
+    def load_index(self, user):
+        """Return {chat_id: meta} for one user without loading any messages"""
+        self._ensure_user(user)
+        return _read_json(self._index_path(user), {})
+
+    def _replay(self, user, chat_id, logs):
+        snapshot = _read_json(self._chat_path(user, chat_id), {})
+        messages = snapshot.get("messages", [])
+        seq = snapshot.get("seq", 0)
+        for path in logs:
+            for record in _read_log(path):
+                if record.get("seq", 0) > seq:
+                    messages.append(record["message"])
+                    seq = record["seq"]
+        return messages, seq
+
+    def load_messages(self, user, chat_id):
+        """Snapshot plus any journal records written after it"""
+        self._ensure_user(user)
+        journal = self._journal(user, chat_id)
+        # a compaction finishing between reading the snapshot and the logs would drop its records
+        with journal.compact_lock:
+            messages, _ = self._replay(user, chat_id, [journal.path + ".compacting", journal.path])
+        return messages
+
+    def load_context(self, user, chat_id):
+        """{"model", "messages", "context"} saved after the chat's last turn, or None"""
+        try:
+            return _read_json(self._context_path(user, chat_id), None)
+        except json.JSONDecodeError:
+            return None
+
+    # ---------- writes ----------
+    def _update_index(self, user, chat_id, meta):
+        with self._lock:
+            index = _read_json(self._index_path(user), {})
+            if meta is None:
+                index.pop(chat_id, None)
+            else:
+                index[chat_id] = meta
+            _write_json(self._index_path(user), index)
+
+    def _journal(self, user, chat_id):
+        key = (user, chat_id)
+        with self._lock:
+            journal = self._journals.get(key)
+            if journal is None:
+                log_path = self._log_path(user, chat_id)
+                _, seq = self._replay(user, chat_id, [log_path + ".compacting", log_path])
+                journal = self._journals[key] = _Journal(log_path, seq)
+            return journal
+
+    def _drop_journal(self, user, chat_id):
+        with self._lock:
+            journal = self._journals.pop((user, chat_id), None)
+            self._dirty_meta.get(user, {}).pop(chat_id, None)
+        if journal is not None:
+            # waits for a running compaction, which would otherwise rewrite the snapshot afterwards
+            with journal.compact_lock, journal.lock:
+                journal.close()
+        log_path = self._log_path(user, chat_id)
+        for path in (log_path, log_path + ".compacting"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def create_chat(self, user, chat_id, meta):
+        self._ensure_user(user)
+        _write_json(self._chat_path(user, chat_id), {"messages": [], "seq": 0})
+        self._update_index(user, chat_id, meta)
+
+    def append_message(self, user, chat_id, meta, message):
+        """Append one message to the chat's journal; the index entry is written lazily"""
+        journal = self._journal(user, chat_id)
+        with journal.lock:
+            journal.seq += 1
+            line = json.dumps({"seq": journal.seq, "message": message}, separators=(",", ":")) + "\n"
+            journal.fh.write(line)
+            journal.fh.flush()
+            journal.size += len(line)
+            journal.pending += 1
+            if journal.pending >= FSYNC_BATCH:
+                journal.sync()
+        with self._lock:
+            self._dirty_meta.setdefault(user, {})[chat_id] = dict(meta)
+
+    def save_context(self, user, chat_id, model, message_count, context):
+        """Persist the model state that covers the chat's first `message_count` messages"""
+        _write_json(self._context_path(user, chat_id),
+                    {"model": model, "messages": message_count, "context": context})
+
+    def delete_chat(self, user, chat_id):
+        self._drop_journal(user, chat_id)
+        self._update_index(user, chat_id, None)
+        for path in (self._chat_path(user, chat_id), self._context_path(user, chat_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # ---------- background work ----------
+    def compact(self, user, chat_id):
+        """Fold a chat's journal into its snapshot without blocking appends"""
+        self._compact(user, chat_id, self._journal(user, chat_id))
+
+    def _compact(self, user, chat_id, journal):
+        compacting = journal.path + ".compacting"
+        with journal.compact_lock:
+            with self._lock:
+                if self._journals.get((user, chat_id)) is not journal:
+                    return  # the chat was deleted after its journal was picked
+            with journal.lock:
+                journal.close()
+                if os.path.exists(compacting):
+                    # leftover from an interrupted compaction: fold both logs in one pass
+                    with open(journal.path, "r") as src, open(compacting, "a") as dst:
+                        dst.write(src.read())
+                    os.remove(journal.path)
+                else:
+                    os.replace(journal.path, compacting)
+                journal.fh = open(journal.path, "a")
+                journal.size = 0
+            messages, seq = self._replay(user, chat_id, [compacting])
+            _write_json(self._chat_path(user, chat_id), {"messages": messages, "seq": seq})
+            os.remove(compacting)
+
+    def flush(self):
+        """fsync pending journal appends and write back batched index updates"""
+        with self._lock:
+            journals = list(self._journals.items())
+            dirty, self._dirty_meta = self._dirty_meta, {}
+        for _, journal in journals:
+            with journal.lock:
+                if not journal.fh.closed:
+                    journal.sync()
+        for user, metas in dirty.items():
+            with self._lock:
+                index = _read_json(self._index_path(user), {})
+                index.update({cid: meta for cid, meta in metas.items() if cid in index})
+                _write_json(self._index_path(user), index)
+        for (user, chat_id), journal in journals:
+            if journal.size >= COMPACT_BYTES:
+                self._compact(user, chat_id, journal)
+
+    def _flush_loop(self):
+        while not self._stop.wait(FSYNC_INTERVAL):
+            try:
+                self.flush()
+            except OSError:
+                continue
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            journals, self._journals = list(self._journals.values()), {}
+        for journal in journals:
+            with journal.lock:
+                if not journal.fh.closed:
+                    journal.close()
@@ -0,0 +1,141 @@
+"""Token-budget-aware prompt packing.
+
+Replaces ad-hoc character slicing (`text[:8000]`, `content[:800]`) with a
+budget measured in approximate tokens. The question is charged first, the
+rest of the model's context window (minus room for the answer) is shared
+between document text and chat history. Document paragraphs repeated across
+documents are only sent once; chat turns are always kept verbatim, oldest
+dropped first, since a repeated reply ("yes") still carries meaning.
+
+Token counts use a fast approximation of BPE tokenizers (about four
+characters per token for words, one per punctuation mark), which is close
+enough to size prompts for `num_ctx` without loading a real tokenizer.
+"""
+import hashlib
+import re
+
+# -------------------- CONFIG --------------------
+NUM_CTX = 4096
+ANSWER_RESERVE = 768
+DOCUMENT_SHARE = 0.7       # of what is left after the question; history gets the rest
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+# -------------------- TOKEN ESTIMATES --------------------
+def _piece_tokens(piece):
+    return (len(piece) + 3) // 4 if piece[0].isalnum() or piece[0] == "_" else 1
+
+
+def estimate_tokens(text):
+    return sum(_piece_tokens(p) for p in _PIECE_RE.findall(text or ""))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Longest prefix of `text` estimated at no more than max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    used = 0
+    for match in _PIECE_RE.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def _fingerprint(text):
+    return hashlib.sha1(" ".join(text.lower().split()).encode()).digest()
+
+
+# -------------------- PACKING --------------------
+class PackedContext:
+    def __init__(self, question, documents, history, tokens, truncated):
+        self.question = question
+        self.documents = documents        # [(name, text)] that made it into the budget
+        self.history = history            # [{"role", "content"}] oldest first
+        self.tokens = tokens              # {"question", "documents", "history", "total"}
+        self.truncated = truncated        # True when anything was cut or dropped
+
+    def documents_text(self, header="--- {name} ---"):
+        return "\n\n".join(f"{header.format(name=name)}\n{text}" if name else text
+                           for name, text in self.documents)
+
+    def history_text(self):
+        return "\n".join(f"{m['role'].title()}: {m['content']}" for m in self.history)
+
+
+class ContextPacker:
+    def __init__(self, num_ctx=NUM_CTX, answer_reserve=ANSWER_RESERVE, document_share=DOCUMENT_SHARE):
+        self.num_ctx = num_ctx
+        self.answer_reserve = answer_reserve
+        self.document_share = document_share
+
+    def _pack_documents(self, documents, budget, seen):
+        """Split the budget evenly across documents, handing unused shares to the longer ones"""
+        docs = []
+        for name, text in documents:
+            paragraphs = []
+            for paragraph in re.split(r"\n\s*\n", text or ""):
+                fp = _fingerprint(paragraph)
+                if paragraph.strip() and fp not in seen:
+                    seen.add(fp)
+                    paragraphs.append(paragraph.strip())
+            body = "\n\n".join(paragraphs)
+            docs.append([name, body, estimate_tokens(body)])
+
+        allowance = {}
+        remaining, pending = budget, sorted(range(len(docs)), key=lambda i: docs[i][2])
+        while pending:
+            share = remaining // len(pending)
+            i = pending.pop(0)
+            allowance[i] = min(docs[i][2], share)
+            remaining -= allowance[i]
+
+        packed, used, truncated = [], 0, False
+        for i, (name, body, tokens) in enumerate(docs):
+            if not body:
+                continue
+            if tokens > allowance[i]:
+                body = truncate_to_tokens(body, allowance[i])
+                truncated = True
+                if not body:
+                    continue
+            packed.append((name, body))
+            used += min(tokens, allowance[i])
+        return packed, used, truncated
+
+    def _pack_history(self, history, budget):
+        """Newest turns first until the budget runs out; older turns are dropped"""
+        kept, used = [], 0
+        for message in reversed(history):
+            tokens = estimate_tokens(message["content"]) + 2  # role marker
+            if used + tokens > budget:
+                return list(reversed(kept)), used, True
+            kept.append(message)
+            used += tokens
+        return list(reversed(kept)), used, False
+
+    def pack(self, question, documents=(), history=(), overhead=""):
+        """Fit `overhead` (fixed instructions), the question, documents and history into num_ctx"""
+        budget = self.num_ctx - self.answer_reserve - estimate_tokens(overhead)
+        question_tokens = estimate_tokens(question)
+        truncated = False
+        if question_tokens > budget // 2:
+            question = truncate_to_tokens(question, budget // 2)
+            question_tokens = estimate_tokens(question)
+            truncated = True
+        budget -= question_tokens
+
+        seen = {_fingerprint(question)}
+        doc_budget = int(budget * self.document_share) if history else budget
+        docs, doc_tokens, docs_cut = self._pack_documents(documents, doc_budget, seen)
+        turns, history_tokens, history_cut = self._pack_history(list(history), budget - doc_tokens)
+
+        tokens = {
+            "question": question_tokens,
+            "documents": doc_tokens,
+            "history": history_tokens,
+            "overhead": estimate_tokens(overhead),
+        }
+        tokens["total"] = sum(tokens.values())
+        return PackedContext(question, docs, turns, tokens, truncated or docs_cut or history_cut)
@@ -0,0 +1,217 @@
+"""Content-addressed cache for text extracted from uploaded documents.
+
+Entries are keyed by a hash of the file bytes plus the extractor's name and
+version, so re-running a Streamlit script (or uploading the same file in
+another session) returns the earlier result instead of extracting again.
+
+Two tiers:
+  * an in-memory LRU bounded by entry count and total characters, shared by
+    every session in the process
+  * a size-capped directory on disk that survives restarts
+
+The disk tier is shared by every script, so each extractor name must belong to
+exactly one function: two functions under one name would serve each other's
+output. cached_extractor() refuses a name already taken by another function.
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# -------------------- CONFIG --------------------
+CACHE_DIR = ".extraction_cache"
+MEMORY_MAX_ENTRIES = 256
+MEMORY_MAX_CHARS = 32 * 1024 * 1024
+DISK_MAX_BYTES = 512 * 1024 * 1024
+
+
+# -------------------- KEYS --------------------
+def content_digest(source):
+    """sha256 of the bytes behind an upload, a bytes object, a PIL image or a NumPy array"""
+    h = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    elif hasattr(source, "getvalue"):
+        h.update(source.getvalue())
+    elif hasattr(source, "tobytes") and hasattr(source, "mode"):
+        # PIL image: decoded pixels, so two encodings of one picture share a key
+        h.update(f"{source.mode}:{source.size}:".encode())
+        h.update(source.tobytes())
+    elif hasattr(source, "tobytes") and hasattr(source, "dtype"):
+        h.update(f"{source.dtype}:{source.shape}:".encode())
+        h.update(source.tobytes())
+    else:
+        raise TypeError(f"Cannot hash {type(source).__name__} for the extraction cache")
+    return h.hexdigest()
+
+
+def cache_key(digest, extractor, version, extra=""):
+    return hashlib.sha256(f"{extractor}\0{version}\0{extra}\0{digest}".encode()).hexdigest()
+
+
+# -------------------- CACHE --------------------
+class ExtractionCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MEMORY_MAX_ENTRIES,
+                 max_chars=MEMORY_MAX_CHARS, disk_max_bytes=DISK_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._chars = 0
+        self._disk_bytes = None  # computed on first disk write
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    # ---------- memory tier ----------
+    def _remember(self, key, text):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._chars -= len(old)
+            self._memory[key] = text
+            self._chars += len(text)
+            while self._memory and (len(self._memory) > self.max_entries or self._chars > self.max_chars):
+                _, evicted = self._memory.popitem(last=False)
+                self._chars -= len(evicted)
+
+    # ---------- disk tier ----------
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".txt"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_size, st.st_atime
+
+    def _store(self, key, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = text.encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(data)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._shrink_disk()
+
+    def _shrink_disk(self):
+        """Drop least recently used files until the directory is 90% of its cap"""
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def _load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                text = f.read().decode("utf-8")
+            os.utime(path)  # mark as recently used for _shrink_disk
+            return text
+        except FileNotFoundError:
+            return None
+
+    # ---------- public API ----------
+    def get(self, key):
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+        text = self._load(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if text is not None:
+            self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        self._remember(key, text)
+        try:
+            self._store(key, text)
+        except OSError:
+            pass  # the disk tier is best effort; memory still serves this process
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_chars": self._chars,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache shared by every session and script"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
+
+
+_extractors = {}  # name -> (file, qualified name) of the function that owns it
+_extractors_lock = threading.Lock()
+
+
+def cached_extractor(name, version="1", reject=None):
+    """Decorator caching `fn(source, *args)` by the content of `source`.
+
+    `reject(text)` returning True keeps a result (typically an error message)
+    out of the cache so the next call retries the extraction. Raises
+    ValueError if `name` is already registered by a different function.
+    """
+    def decorator(fn):
+        owner = (os.path.abspath(fn.__code__.co_filename), fn.__qualname__)
+        with _extractors_lock:
+            # a Streamlit rerun decorates the same function again, which is fine
+            if _extractors.setdefault(name, owner) != owner:
+                raise ValueError(f"extractor name {name!r} is already used by {_extractors[name][1]}")
+
+        @functools.wraps(fn)
+        def wrapper(source, *args, **kwargs):
+            extra = repr((args, sorted(kwargs.items()))) if args or kwargs else ""
+            key = cache_key(content_digest(source), name, version, extra)
+            cache = get_cache()
+            text = cache.get(key)
+            if text is not None:
+                return text
+            text = fn(source, *args, **kwargs)
+            if isinstance(text, str) and not (reject and reject(text)):
+                cache.put(key, text)
+            return text
+        return wrapper
+    return decorator
@@ -0,0 +1,126 @@
+"""Process-wide registry of in-flight Ollama generations, for real cancellation.
+
+A Streamlit stop button only causes a rerun; the HTTP stream of the previous
+run stays open and Ollama keeps generating tokens nobody reads. Generations
+registered here can be cancelled by request id from any session thread:
+cancel() shuts down the underlying socket, so the blocked reader wakes up at
+once and Ollama sees the client disconnect and aborts, and it releases the
+generation's concurrency slot immediately instead of waiting for the old run
+to unwind.
+"""
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+# -------------------- CONFIG --------------------
+MAX_GENERATIONS = int(os.environ.get("OLLAMA_MAX_GENERATIONS", "4"))
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+def _close_response(response):
+    """Close a streaming requests.Response, shutting the socket down first"""
+    raw = getattr(response, "raw", None)
+    conn = getattr(raw, "connection", None) or getattr(raw, "_connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+class Generation:
+    def __init__(self, registry, request_id):
+        self.registry = registry
+        self.request_id = request_id
+        self.response = None
+        self.cancelled = False
+        self._slot_held = False
+        self._lock = threading.Lock()
+
+    def attach(self, response):
+        """Register the streaming response; closes it at once if cancel() already ran"""
+        with self._lock:
+            self.response = response
+            cancelled = self.cancelled
+        if cancelled:
+            _close_response(response)
+            raise GenerationCancelled(self.request_id)
+
+    def _release(self):
+        with self._lock:
+            held, self._slot_held = self._slot_held, False
+        if held:
+            self.registry._slots.release()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            response = self.response
+        if response is not None:
+            _close_response(response)
+        self._release()
+
+
+class GenerationRegistry:
+    def __init__(self, max_concurrent=MAX_GENERATIONS):
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._active = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def generation(self, request_id, timeout=None):
+        """Hold a concurrency slot for `request_id` while its stream is read"""
+        gen = Generation(self, request_id)
+        with self._lock:
+            self._active[request_id] = gen
+        try:
+            if not self._slots.acquire(timeout=timeout):
+                raise TimeoutError("All generation slots are busy")
+            with gen._lock:
+                gen._slot_held = True
+                cancelled = gen.cancelled
+            if cancelled:
+                raise GenerationCancelled(request_id)
+            yield gen
+        finally:
+            gen._release()
+            with self._lock:
+                if self._active.get(request_id) is gen:
+                    del self._active[request_id]
+            if gen.response is not None:
+                gen.response.close()
+
+    def cancel(self, request_id):
+        """Abort a generation from any thread; False if it already finished"""
+        with self._lock:
+            gen = self._active.get(request_id)
+        if gen is None:
+            return False
+        gen.cancel()
+        return True
+
+    def active(self):
+        with self._lock:
+            return list(self._active)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GenerationRegistry()
+        return _registry
@@ -0,0 +1,86 @@
+"""Concurrent ingestion of multi-file uploads.
+
+Extracting uploads one after another on the Streamlit script thread takes the
+sum of their extraction times. ingest() runs one job per file on a shared
+thread pool, so the wall time approaches that of the slowest file:
+
+  * I/O-bound work (LLaVA OCR over HTTP, reading DOCX/TXT, PDF text layers,
+    whose scanned pages already fan out to pdf_ocr's process pool) runs on
+    the I/O threads themselves
+  * CPU-bound image OCR is handed from those threads to a warm process pool
+    through ocr_image_in_pool(), so it is not serialized by the GIL
+
+Results are returned in upload order whatever order the files finish in.
+The progress callback runs on the caller's thread, so it may update
+Streamlit widgets; jobs must not.
+
+The OCR stack (pdf_ocr, ocr_engines, ocr_preprocess and so pdf2image, numpy
+and OpenCV) is imported only when CPU work is actually submitted, so scripts
+that use just the thread pool import without it.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# -------------------- CONFIG --------------------
+INGEST_IO_WORKERS = int(os.environ.get("INGEST_IO_WORKERS", "8"))
+
+
+# -------------------- CPU WORK (process pool) --------------------
+def ocr_image(image, psm=None, binarize=True):
+    """Preprocess and OCR one image; runs inside a pool process, so it lives in an importable module"""
+    import ocr_engines
+    from ocr_preprocess import preprocess
+
+    prepared, _ = preprocess(image, binarize=binarize)
+    return ocr_engines.image_to_text("tesseract", prepared, psm=psm)
+
+
+def run_cpu(fn, *args):
+    """Run fn(*args) in the warm Tesseract process pool and wait for the result"""
+    import pdf_ocr
+
+    return pdf_ocr.get_pool("tesseract").submit(fn, *args).result()
+
+
+def ocr_image_in_pool(image, psm=None, binarize=True):
+    return run_cpu(ocr_image, image, psm, binarize)
+
+
+# -------------------- I/O WORK (thread pool) --------------------
+_io_pool = None
+_io_pool_lock = threading.Lock()
+
+
+def get_io_pool():
+    """Process-wide thread pool shared by every session"""
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=INGEST_IO_WORKERS, thread_name_prefix="ingest")
+        return _io_pool
+
+
+def ingest(items, job, on_progress=None):
+    """Run job(item) for every item concurrently and return the results in item order.
+
+    on_progress(index, item, result, done, total) is called as each job
+    finishes. If a job raises, the jobs not yet started are cancelled and the
+    exception propagates.
+    """
+    items = list(items)
+    if not items:
+        return []
+    pool = get_io_pool()
+    futures = {pool.submit(job, item): index for index, item in enumerate(items)}
+    results = [None] * len(items)
+    try:
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            results[index] = future.result()
+            if on_progress is not None:
+                on_progress(index, items[index], results[index], done, len(items))
+    finally:
+        for future in futures:
+            future.cancel()
+    return results
@@ -0,0 +1,200 @@
+"""Background preloading of Ollama models and cold/warm time-to-first-token.
+
+Ollama unloads an idle model after its keep_alive expires, and the next
+question then pays the whole model load before the first token. Each script
+calls warm(model, options) when it starts: the model is loaded on a background
+thread with an empty /api/generate request (which only loads it) and kept
+resident for KEEP_ALIVE. The preload must carry the same runner options
+(num_ctx) as the script's real requests, since Ollama reloads the model
+whenever they change. ollama_client also sends KEEP_ALIVE with every generate/chat
+call, so normal use keeps the model resident too.
+
+Per-model state (cold / loading / ready / failed) and the measured
+time-to-first-token, split into cold and warm requests, are exposed through
+status() and status_text() for the sidebar.
+"""
+import threading
+import time
+
+import ollama_client
+
+# -------------------- CONFIG --------------------
+KEEP_ALIVE = ollama_client.KEEP_ALIVE
+LOAD_TIMEOUT = 300
+RETRY_AFTER = 30  # seconds before a failed load is attempted again
+
+COLD = "cold"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+def _keep_alive_seconds(keep_alive):
+    """Seconds for an Ollama duration such as "30m", "1h", "90s" or 300; None means forever"""
+    if isinstance(keep_alive, (int, float)):
+        return None if keep_alive < 0 else float(keep_alive)
+    units = {"s": 1, "m": 60, "h": 3600}
+    text = str(keep_alive).strip()
+    try:
+        if text[-1:] in units:
+            value = float(text[:-1]) * units[text[-1]]
+        else:
+            value = float(text)
+    except ValueError:
+        return None
+    return None if value < 0 else value
+
+
+class _ModelState:
+    def __init__(self):
+        self.state = COLD
+        self.options = {}
+        self.load_seconds = None
+        self.error = None
+        self.failed_at = None
+        self.last_used = None
+        self.cold_ttft = []
+        self.warm_ttft = []
+
+
+class Timing:
+    """Measures one request's time-to-first-token; see ModelWarmer.start()"""
+
+    def __init__(self, warmer, model, warm):
+        self.warmer = warmer
+        self.model = model
+        self.warm = warm
+        self.started = time.perf_counter()
+        self.ttft = None
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+            self.warmer._record(self.model, self.ttft, self.warm)
+        return self.ttft
+
+    def record_response(self, body):
+        """For non-streaming calls: use Ollama's own load + prompt-eval time when reported"""
+        if self.ttft is None and body.get("prompt_eval_duration") is not None:
+            self.ttft = (body.get("load_duration", 0) + body["prompt_eval_duration"]) / 1e9
+            self.warmer._record(self.model, self.ttft, self.warm)
+        return self.first_token()
+
+
+class ModelWarmer:
+    def __init__(self, keep_alive=KEEP_ALIVE):
+        self.keep_alive = keep_alive
+        self._expires_after = _keep_alive_seconds(keep_alive)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model):
+        entry = self._models.get(model)
+        if entry is None:
+            entry = self._models[model] = _ModelState()
+        return entry
+
+    def _expired(self, entry):
+        return (
+            entry.state == READY
+            and self._expires_after is not None
+            and entry.last_used is not None
+            and time.monotonic() - entry.last_used > self._expires_after
+        )
+
+    def warm(self, model, options=None):
+        """Start loading `model` with the runner `options` its requests will use, unless already loaded or loading"""
+        options = dict(options or {})
+        with self._lock:
+            entry = self._get(model)
+            if self._expired(entry) or entry.options != options:
+                entry.state = COLD
+            if entry.state in (LOADING, READY):
+                return
+            if entry.state == FAILED and time.monotonic() - entry.failed_at < RETRY_AFTER:
+                return
+            entry.state, entry.options = LOADING, options
+        threading.Thread(target=self._load, args=(model, options), name=f"warmup-{model}", daemon=True).start()
+
+    def _load(self, model, options):
+        started = time.perf_counter()
+        fields = {"options": options} if options else {}
+        try:
+            ollama_client.generate(model, "", timeout=LOAD_TIMEOUT, keep_alive=self.keep_alive, **fields)
+        except Exception as e:
+            with self._lock:
+                entry = self._get(model)
+                entry.state, entry.error = FAILED, str(e)
+                entry.failed_at = time.monotonic()
+            return
+        with self._lock:
+            entry = self._get(model)
+            entry.state, entry.error = READY, None
+            entry.load_seconds = time.perf_counter() - started
+            entry.last_used = time.monotonic()
+
+    def start(self, model):
+        """Call just before sending a request; call .first_token() on the result when it arrives"""
+        with self._lock:
+            entry = self._get(model)
+            warm = entry.state == READY and not self._expired(entry)
+        return Timing(self, model, warm)
+
+    def _record(self, model, seconds, warm):
+        with self._lock:
+            entry = self._get(model)
+            (entry.warm_ttft if warm else entry.cold_ttft).append(seconds)
+            entry.state, entry.error = READY, None
+            entry.last_used = time.monotonic()
+
+    def status(self, model):
+        with self._lock:
+            entry = self._get(model)
+            if self._expired(entry):
+                entry.state = COLD
+            mean = lambda xs: sum(xs) / len(xs) if xs else None
+            return {
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "error": entry.error,
+                "cold_ttft": mean(entry.cold_ttft),
+                "warm_ttft": mean(entry.warm_ttft),
+                "requests": len(entry.cold_ttft) + len(entry.warm_ttft),
+            }
+
+    def status_text(self, model):
+        """One-line summary for a sidebar caption"""
+        s = self.status(model)
+        if s["state"] == LOADING:
+            text = f"⏳ {model} loading…"
+        elif s["state"] == READY:
+            text = f"🟢 {model} ready" + (f" (loaded in {s['load_seconds']:.1f}s)" if s["load_seconds"] else "")
+        elif s["state"] == FAILED:
+            text = f"⚠️ {model} failed to load: {s['error']}"
+        else:
+            text = f"⚪ {model} not loaded"
+        ttft = [f"{label} {s[key]:.2f}s" for label, key in (("cold", "cold_ttft"), ("warm", "warm_ttft")) if s[key] is not None]
+        if ttft:
+            text += " · first token " + ", ".join(ttft)
+        return text
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def get_warmer():
+    """Process-wide warmer shared by every session"""
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = ModelWarmer()
+        return _warmer
+
+
+def warm(model, options=None):
+    get_warmer().warm(model, options)
+
+
+def status_text(model):
+    return get_warmer().status_text(model)
@@ -0,0 +1,244 @@
+"""Process-wide registry of OCR engines.
+
+Engines are built the first time they are used, not at import time, and one
+warm instance per process is shared by every Streamlit session. Each engine
+has a fixed number of worker slots bounding how many callers may use it at
+once; backends that are not thread-safe (PaddleOCR) default to one.
+
+The "tesseract" engine keeps long-lived in-process Tesseract instances
+(tesserocr) when that binding is installed: language data is loaded once per
+worker and images are handed over as in-memory buffers, instead of pytesseract
+forking a tesseract process and writing temp files for every image. Without
+tesserocr it falls back to pytesseract.
+
+Run `python ocr_engines.py` for a throughput benchmark of the two paths.
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# -------------------- CONFIG --------------------
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "1"))
+TESSERACT_WORKERS = int(os.environ.get("TESSERACT_WORKERS", os.cpu_count() or 1))
+TESSERACT_LANG = os.environ.get("TESSERACT_LANG", "eng")
+
+
+# -------------------- REGISTRY --------------------
+class _Engine:
+    def __init__(self, name, factory, workers, reader):
+        self.name = name
+        self.factory = factory
+        self.workers = workers
+        self.reader = reader
+        self.slots = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.instance = None
+        self.load_seconds = None
+        self.error = None
+
+    def get(self):
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    start = time.perf_counter()
+                    try:
+                        self.instance = self.factory()
+                    except Exception as e:
+                        self.error = str(e)
+                        raise
+                    self.load_seconds = time.perf_counter() - start
+                    self.error = None
+        return self.instance
+
+
+_engines = {}
+_registry_lock = threading.Lock()
+
+
+def register_engine(name, factory, workers=None, reader=None):
+    """Register a zero-argument factory; nothing is loaded until first use.
+
+    `reader(instance, image_array, **options)` turns the engine's raw output
+    into text and is what image_to_text() calls.
+    """
+    with _registry_lock:
+        _engines[name] = _Engine(name, factory, workers or OCR_WORKERS, reader)
+
+
+def get_engine(name):
+    try:
+        return _engines[name].get()
+    except KeyError:
+        raise KeyError(f"Unknown OCR engine '{name}'. Registered: {', '.join(_engines)}") from None
+
+
+@contextmanager
+def engine_slot(name):
+    """Borrow the shared engine instance, waiting for a free worker slot"""
+    engine = _engines[name]
+    with engine.slots:
+        yield engine.get()
+
+
+def image_to_text(name, image_array, **options):
+    """Run one image through an engine and return its text, one line per detected line.
+
+    `options` are engine specific, e.g. psm=6 for Tesseract.
+    """
+    engine = _engines[name]
+    with engine_slot(name) as instance:
+        return engine.reader(instance, image_array, **options)
+
+
+def load_stats():
+    """Model load time per engine, for display in the UI or logs"""
+    with _registry_lock:
+        engines = list(_engines.values())
+    return {
+        e.name: {
+            "loaded": e.instance is not None,
+            "load_seconds": e.load_seconds,
+            "workers": e.workers,
+            "error": e.error,
+        }
+        for e in engines
+    }
+
+
+# -------------------- BUILT-IN ENGINES --------------------
+def _paddle():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=True, lang="en")
+
+
+def _read_paddle(ocr, image_array):
+    result = ocr.ocr(image_array)
+    # PaddleOCR returns [None] for a page without any detected text
+    return "\n".join(line[1][0] for line in (result[0] or [])).strip()
+
+
+def _easyocr():
+    import easyocr
+    return easyocr.Reader(["en"])
+
+
+def _read_easyocr(reader, image_array):
+    return "\n".join(reader.readtext(image_array, detail=0)).strip()
+
+
+class TesserocrPool:
+    """Reusable tesserocr.PyTessBaseAPI instances, created on demand.
+
+    An instance must only be used by one thread at a time; the engine's worker
+    slots bound how many are ever created.
+    """
+
+    def __init__(self, tesserocr, lang=TESSERACT_LANG):
+        self.tesserocr = tesserocr
+        self.lang = lang
+        self._idle = queue.LifoQueue()  # most recently used first: its caches are warm
+
+    @contextmanager
+    def api(self):
+        try:
+            api = self._idle.get_nowait()
+        except queue.Empty:
+            api = self.tesserocr.PyTessBaseAPI(lang=self.lang)
+        try:
+            yield api
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def image_to_string(self, image_array, psm=None):
+        image = np.ascontiguousarray(np.asarray(image_array, dtype=np.uint8))
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        with self.api() as api:
+            api.SetPageSegMode(self.tesserocr.PSM.AUTO if psm is None else psm)
+            api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+            return api.GetUTF8Text()
+
+
+def _tesseract():
+    try:
+        import tesserocr
+    except ImportError:
+        import pytesseract
+        pytesseract.get_tesseract_version()  # fail here, not mid-document, if the binary is missing
+        return pytesseract
+    pool = TesserocrPool(tesserocr)
+    with pool.api():  # load the language data now, not on the first image
+        pass
+    return pool
+
+
+def _read_tesseract(backend, image_array, psm=None):
+    if isinstance(backend, TesserocrPool):
+        return backend.image_to_string(image_array, psm=psm).strip()
+    config = f"--psm {psm}" if psm is not None else ""
+    return backend.image_to_string(image_array, config=config).strip()
+
+
+register_engine("paddle", _paddle, reader=_read_paddle)
+register_engine("easyocr", _easyocr, reader=_read_easyocr)
+# one tesserocr instance (or tesseract process) per slot, so callers need not be serialized
+register_engine("tesseract", _tesseract, workers=TESSERACT_WORKERS, reader=_read_tesseract)
+
+
+# -------------------- BENCHMARK --------------------
+def _receipts(count, seed=0):
+    """Small synthetic receipt-like images as uint8 arrays"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 22)
+    except OSError:
+        font = ImageFont.load_default(size=22)
+    rng = np.random.default_rng(seed)
+    images = []
+    for n in range(count):
+        image = Image.new("L", (640, 420), 255)
+        draw = ImageDraw.Draw(image)
+        draw.text((30, 20), f"RECEIPT #{1000 + n}", fill=0, font=font)
+        for row in range(8):
+            draw.text((30, 70 + row * 40), f"Item {row + 1:02d}   qty {rng.integers(1, 9)}   {rng.uniform(1, 99):8.2f}", fill=0, font=font)
+        images.append(np.asarray(image))
+    return images
+
+
+def _benchmark(count=60, workers=TESSERACT_WORKERS):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import pytesseract
+
+    images = _receipts(count)
+    start = time.perf_counter()
+    for image in images:
+        pytesseract.image_to_string(image, config="--psm 6")
+    subprocess_rate = count / (time.perf_counter() - start)
+
+    with ThreadPoolExecutor(workers) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda image: pytesseract.image_to_string(image, config="--psm 6"), images))
+        subprocess_threads_rate = count / (time.perf_counter() - start)
+
+    backend = get_engine("tesseract")
+    kind = "tesserocr" if isinstance(backend, TesserocrPool) else "pytesseract (tesserocr not installed)"
+    with ThreadPoolExecutor(workers) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda image: image_to_text("tesseract", image, psm=6), images))
+        engine_rate = count / (time.perf_counter() - start)
+
+    print(f"{count} receipts, {workers} workers")
+    print(f"  pytesseract, one process per image, sequential : {subprocess_rate:7.1f} images/s")
+    print(f"  pytesseract, one process per image, {workers} threads  : {subprocess_threads_rate:7.1f} images/s")
+    print(f"  tesseract engine pool [{kind}]: {engine_rate:7.1f} images/s")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,153 @@
+"""Shared, connection-pooled HTTP client for the local Ollama server.
+
+All scripts talk to Ollama through one requests.Session per process, so
+repeated questions, token streams and health probes reuse keep-alive TCP
+connections instead of opening a new one per call. Pool size, timeouts and
+retry/backoff are configurable through configure() or the environment.
+Generate and chat requests carry KEEP_ALIVE unless the caller sets keep_alive.
+OLLAMA_HOST accepts the same forms as the ollama CLI and library, including
+schemeless ones such as "0.0.0.0:11434" or "myhost" (see normalize_host).
+"""
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_PORT = 11434
+
+
+def normalize_host(host):
+    """Base URL for an OLLAMA_HOST value, read the way the ollama CLI reads it.
+
+    Without a scheme, http:// is assumed and the port defaults to DEFAULT_PORT
+    ("0.0.0.0" -> "http://0.0.0.0:11434"); with an explicit scheme the port is
+    the scheme's own. A trailing "/" is dropped.
+    """
+    host = (host or "").strip().rstrip("/") or "localhost"
+    if "://" in host:
+        return host
+    parts = urlsplit(f"http://{host}")
+    netloc = parts.netloc
+    if parts.port is None:
+        netloc = f"{netloc.rstrip(':')}:{DEFAULT_PORT}"
+    return parts._replace(netloc=netloc).geturl().rstrip("/")
+
+
+# -------------------- CONFIG --------------------
+OLLAMA_HOST = normalize_host(os.environ.get("OLLAMA_HOST") or "http://localhost:11434")
+POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "16"))
+CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "120"))
+RETRIES = int(os.environ.get("OLLAMA_RETRIES", "2"))
+BACKOFF = float(os.environ.get("OLLAMA_BACKOFF", "0.5"))
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps a model loaded after a request
+
+_sessions = {}  # retry count -> pooled Session
+_session_lock = threading.Lock()
+
+
+# -------------------- SESSION --------------------
+def _build_session(retries):
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,  # never replay a request whose response had already started
+        status=retries,
+        backoff_factor=BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(retries=None):
+    """Pooled session; health probes pass retries=0 so they fail fast"""
+    retries = RETRIES if retries is None else retries
+    with _session_lock:
+        session = _sessions.get(retries)
+        if session is None:
+            session = _sessions[retries] = _build_session(retries)
+        return session
+
+
+def configure(host=None, pool_size=None, connect_timeout=None, read_timeout=None, retries=None, backoff=None):
+    """Override the defaults; pooled sessions are rebuilt on next use"""
+    global OLLAMA_HOST, POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, RETRIES, BACKOFF
+    with _session_lock:
+        OLLAMA_HOST = normalize_host(host) if host else OLLAMA_HOST
+        POOL_SIZE = pool_size or POOL_SIZE
+        CONNECT_TIMEOUT = connect_timeout or CONNECT_TIMEOUT
+        READ_TIMEOUT = read_timeout or READ_TIMEOUT
+        RETRIES = RETRIES if retries is None else retries
+        BACKOFF = BACKOFF if backoff is None else backoff
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return (CONNECT_TIMEOUT, READ_TIMEOUT)
+    if isinstance(timeout, tuple):
+        return timeout
+    return (min(CONNECT_TIMEOUT, timeout), timeout)
+
+
+# -------------------- REQUESTS --------------------
+def post(path, payload, stream=False, timeout=None):
+    """POST JSON to an Ollama endpoint such as "/api/generate" and return the raw response"""
+    if path in ("/api/generate", "/api/chat") and "keep_alive" not in payload:
+        payload = {**payload, "keep_alive": KEEP_ALIVE}
+    r = get_session().post(f"{OLLAMA_HOST}{path}", json=payload, stream=stream, timeout=_timeout(timeout))
+    r.raise_for_status()
+    return r
+
+
+def iter_stream(response):
+    """Yield each JSON record of a streaming response, skipping malformed lines"""
+    for line in response.iter_lines():
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+
+
+def generate(model, prompt, timeout=None, **fields):
+    """Non-streaming /api/generate; returns the decoded JSON body"""
+    payload = {"model": model, "prompt": prompt, "stream": False, **fields}
+    return post("/api/generate", payload, timeout=timeout).json()
+
+
+def chat(model, messages, timeout=None, **fields):
+    """Non-streaming /api/chat; returns the decoded JSON body ({"message": {...}, ...})"""
+    payload = {"model": model, "messages": messages, "stream": False, **fields}
+    return post("/api/chat", payload, timeout=timeout).json()
+
+
+def embed(model, inputs, timeout=None):
+    return post("/api/embed", {"model": model, "input": inputs}, timeout=timeout).json()["embeddings"]
+
+
+def tags(timeout=None, retries=None):
+    r = get_session(retries).get(f"{OLLAMA_HOST}/api/tags", timeout=_timeout(timeout))
+    r.raise_for_status()
+    return r.json()
+
+
+def is_available(timeout=1):
+    try:
+        tags(timeout=timeout, retries=0)
+        return True
+    except requests.exceptions.RequestException:
+        return False
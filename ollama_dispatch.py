@@ -0,0 +1,197 @@
+"""Asyncio dispatcher that schedules Ollama requests fairly across users.
+
+Every Streamlit session runs on its own script thread, so without
+coordination each one calls Ollama directly and all of them slow down
+together. This module owns a background event loop, and the scripts hand
+requests to it:
+
+  * at most MAX_CONCURRENT requests are in flight to Ollama at once
+  * each user has their own FIFO queue and free slots are handed out
+    round-robin across users, so one heavy user cannot starve the others
+  * admission control rejects a request (QueueFullError) once the global
+    queue or that user's queue is too deep
+
+submit() returns a Ticket the UI can poll for its queue position while it
+waits for the result.
+"""
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import threading
+from collections import OrderedDict, deque
+
+import ollama_client
+
+# -------------------- CONFIG --------------------
+MAX_CONCURRENT = int(os.environ.get("OLLAMA_MAX_CONCURRENT", "2"))
+MAX_QUEUE = int(os.environ.get("OLLAMA_MAX_QUEUE", "64"))
+MAX_QUEUE_PER_USER = int(os.environ.get("OLLAMA_MAX_QUEUE_PER_USER", "4"))
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+# -------------------- TICKETS --------------------
+class Ticket:
+    """Handle for one queued request"""
+
+    def __init__(self, dispatcher, user, fn, args, kwargs):
+        self.id = next(dispatcher._ids)
+        self.user = user
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.started = threading.Event()
+        self._dispatcher = dispatcher
+        self._future = None  # concurrent.futures.Future bridging to the caller's thread
+
+    def position(self):
+        """0 once running, otherwise how many requests will be started before this one"""
+        return self._dispatcher.position(self)
+
+    def done(self):
+        return self._future.done()
+
+    def wait(self, timeout=None):
+        """Block up to `timeout` seconds; True once the result is ready"""
+        concurrent.futures.wait([self._future], timeout)
+        return self._future.done()
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
+
+    def cancel(self):
+        return self._dispatcher.cancel(self)
+
+
+# -------------------- DISPATCHER --------------------
+class Dispatcher:
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, max_queue_per_user=MAX_QUEUE_PER_USER):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # user -> deque[Ticket]; order is the round-robin order
+        self._running = 0
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        threading.Thread(target=self._run_loop, name="ollama-dispatch", daemon=True).start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._loop.create_task(self._schedule())
+        self._loop.run_forever()
+
+    # ---------- caller side (any thread) ----------
+    def submit(self, user, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) on behalf of `user`; raises QueueFullError when saturated"""
+        ticket = Ticket(self, user, fn, args, kwargs)
+        ticket._future = concurrent.futures.Future()
+        with self._lock:
+            queued = sum(len(q) for q in self._queues.values())
+            if queued >= self.max_queue:
+                raise QueueFullError("The assistant is busy right now, please try again in a moment.")
+            user_queue = self._queues.setdefault(user, deque())
+            if len(user_queue) >= self.max_queue_per_user:
+                raise QueueFullError("You already have several requests waiting, please wait for them to finish.")
+            user_queue.append(ticket)
+        self._loop.call_soon_threadsafe(self._notify)
+        return ticket
+
+    def position(self, ticket):
+        with self._lock:
+            if ticket.started.is_set() or ticket._future.done():
+                return 0
+            queue = self._queues.get(ticket.user)
+            if not queue or ticket not in queue:
+                return 0
+            mine = queue.index(ticket)
+            # round-robin: each other user gets at most `mine + 1` turns before ours
+            ahead = mine
+            for user, other in self._queues.items():
+                if user != ticket.user:
+                    ahead += min(len(other), mine + 1)
+            return ahead + 1
+
+    def cancel(self, ticket):
+        with self._lock:
+            queue = self._queues.get(ticket.user)
+            if queue and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.user]
+                ticket._future.cancel()
+                return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "users_waiting": len(self._queues),
+                "max_concurrent": self.max_concurrent,
+            }
+
+    # ---------- loop side ----------
+    def _notify(self):
+        self._wakeup.set()
+
+    def _next_ticket(self):
+        """Pop the head of the first user's queue and move that user to the back"""
+        with self._lock:
+            if self._running >= self.max_concurrent or not self._queues:
+                return None
+            user, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            self._running += 1
+            return ticket
+
+    async def _schedule(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                ticket = self._next_ticket()
+                if ticket is None:
+                    break
+                self._loop.create_task(self._execute(ticket))
+
+    async def _execute(self, ticket):
+        ticket.started.set()
+        try:
+            if ticket._future.set_running_or_notify_cancel():
+                try:
+                    result = await asyncio.to_thread(ticket.fn, *ticket.args, **ticket.kwargs)
+                    ticket._future.set_result(result)
+                except Exception as e:
+                    ticket._future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._wakeup.set()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Process-wide dispatcher shared by every session"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher()
+        return _dispatcher
+
+
+def submit_generate(user, model, prompt, **fields):
+    """Queue an ollama_client.generate() call for `user`"""
+    return get_dispatcher().submit(user, ollama_client.generate, model, prompt, **fields)
@@ -0,0 +1,161 @@
+"""Background health monitoring and a circuit breaker for the Ollama server.
+
+Probing Ollama inline (GET /api/tags) costs up to the probe timeout on every
+prompt while the server is down. HealthMonitor probes on a daemon thread
+instead and callers read the cached result, which is trusted for HEALTH_TTL
+seconds. Its CircuitBreaker guards the real requests:
+
+  * closed     requests go through; FAILURE_THRESHOLD consecutive failures open it
+  * open       requests fail fast to the caller's fallback for RESET_TIMEOUT seconds
+  * half-open  one trial request is let through; success closes the breaker,
+               failure opens it again
+
+Failed probes open the breaker too, and a successful probe moves an open
+breaker to half-open, so recovery is noticed without waiting for a user.
+"""
+import os
+import threading
+import time
+
+import ollama_client
+
+# -------------------- CONFIG --------------------
+PROBE_INTERVAL = float(os.environ.get("OLLAMA_PROBE_INTERVAL", "5"))
+PROBE_TIMEOUT = float(os.environ.get("OLLAMA_PROBE_TIMEOUT", "1"))
+HEALTH_TTL = float(os.environ.get("OLLAMA_HEALTH_TTL", "15"))
+FAILURE_THRESHOLD = int(os.environ.get("OLLAMA_FAILURE_THRESHOLD", "3"))
+RESET_TIMEOUT = float(os.environ.get("OLLAMA_RESET_TIMEOUT", "10"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+# -------------------- CIRCUIT BREAKER --------------------
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """True if a request may go to Ollama now; False means use the fallback"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self):
+        """Open immediately, e.g. after a failed health probe"""
+        with self._lock:
+            self._trial_running = False
+            self._open()
+
+    def half_open(self):
+        """Let the next request through as a trial, e.g. after a successful probe"""
+        with self._lock:
+            if self.state == OPEN:
+                self.state = HALF_OPEN
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = self.clock()
+
+
+# -------------------- HEALTH MONITOR --------------------
+class HealthMonitor:
+    def __init__(self, probe=None, interval=PROBE_INTERVAL, ttl=HEALTH_TTL, breaker=None):
+        self.probe = probe or (lambda: ollama_client.is_available(timeout=PROBE_TIMEOUT))
+        self.interval = interval
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker()
+        self.healthy = False
+        self.checked_at = None
+        self._probed = threading.Event()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def check_now(self):
+        """Ask the monitor thread to probe without waiting for the next interval"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._probe_once()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _probe_once(self):
+        try:
+            healthy = bool(self.probe())
+        except Exception:
+            healthy = False
+        self.healthy, self.checked_at = healthy, time.monotonic()
+        if healthy:
+            self.breaker.half_open()
+        else:
+            self.breaker.trip()
+        self._probed.set()
+
+    def is_available(self, wait=PROBE_TIMEOUT):
+        """Cached health; only waits (up to `wait`) for the very first probe"""
+        if not self._probed.is_set():
+            self.start()
+            self._probed.wait(wait)
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.ttl:
+            self.check_now()
+            return False
+        return self.healthy
+
+    def status(self):
+        age = None if self.checked_at is None else time.monotonic() - self.checked_at
+        return {"healthy": self.healthy, "checked_ago": age, "breaker": self.breaker.state}
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor():
+    """Process-wide monitor shared by every session, started on first use"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor()
+        return _monitor.start()
@@ -0,0 +1,88 @@
+"""Text-layer-first PDF extraction with per-page OCR fallback.
+
+Most uploaded PDFs are born digital, so the embedded text layer is read
+first. Only pages whose text layer is empty or unreadable (scans, broken font
+encodings) are rasterized and sent to OCR through pdf_ocr, which keeps the
+cost of a mostly-digital document close to that of plain PyPDF2 while still
+handling scanned pages.
+"""
+import io
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        PdfReader = None
+
+# -------------------- CONFIG --------------------
+MIN_PAGE_CHARS = 20          # fewer non-space characters than this means "no text layer"
+MIN_READABLE_RATIO = 0.7     # share of letters, digits and common punctuation
+READABLE_PUNCTUATION = set(".,;:!?'\"()[]{}-–—/%&@#$€£+*=<>_|•·…")
+
+
+# -------------------- PAGE CHECKS --------------------
+def page_needs_ocr(text):
+    """True when a page's text layer is missing or looks like garbage"""
+    stripped = "".join((text or "").split())
+    if len(stripped) < MIN_PAGE_CHARS:
+        return True
+    if "(cid:" in stripped or stripped.count("�") > len(stripped) * 0.05:
+        return True
+    readable = sum(1 for ch in stripped if ch.isalnum() or ch in READABLE_PUNCTUATION)
+    return readable / len(stripped) < MIN_READABLE_RATIO
+
+
+def _as_bytes_and_stream(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source), io.BytesIO(source)
+    if hasattr(source, "getvalue"):
+        data = source.getvalue()
+        return data, io.BytesIO(data)
+    source.seek(0)
+    data = source.read()
+    return data, io.BytesIO(data)
+
+
+# -------------------- EXTRACTION --------------------
+def iter_pdf_pages(source, ocr_engine="tesseract", workers=None):
+    """Yield (page_number, page_count, text, used_ocr) in page order.
+
+    `source` may be bytes, a Streamlit upload or an open binary file. When the
+    OCR stack (pdf2image/poppler or the engine) is unavailable, pages keep
+    whatever their text layer held.
+    """
+    if PdfReader is None:
+        raise ImportError("PDF processing needs PyPDF2 or pypdf: pip install pypdf")
+    data, stream = _as_bytes_and_stream(source)
+    reader = PdfReader(stream)
+    texts = [page.extract_text() or "" for page in reader.pages]
+    total = len(texts)
+    ocr_pages = [i + 1 for i, text in enumerate(texts) if page_needs_ocr(text)]
+
+    ocr_results = iter(())
+    if ocr_pages:
+        try:
+            from pdf_ocr import iter_pdf_ocr
+            ocr_results = iter_pdf_ocr(data, engine=ocr_engine, workers=workers, pages=ocr_pages)
+        except ImportError:
+            ocr_pages = []
+
+    pending_ocr = set(ocr_pages)
+    for number in range(1, total + 1):
+        if number in pending_ocr:
+            try:
+                _, _, text = next(ocr_results)
+                yield number, total, text.strip() or texts[number - 1].strip(), True
+                continue
+            except Exception:
+                # OCR stack failed: fall back to the text layer for this and later pages
+                pending_ocr = set()
+                ocr_results = iter(())
+        yield number, total, texts[number - 1].strip(), False
+
+
+def extract_pdf_pages(source, ocr_engine="tesseract", workers=None):
+    """List of page texts, OCR'ing only the pages that need it"""
+    return [text for _, _, text, _ in iter_pdf_pages(source, ocr_engine, workers)]
@@ -0,0 +1,130 @@
+"""Parallel, page-by-page OCR for scanned PDFs.
+
+Pages are rasterized one at a time and handed to a process pool, with at most
+one page per worker in flight, so peak memory depends on the worker count and
+not on the length of the document. Results are yielded in page order as soon
+as each page is recognized, letting the UI show the first pages while later
+ones are still being processed.
+
+Every pool process loads its own OCR engine once (through ocr_engines) and
+keeps it warm for the next document. A pool that breaks (a worker killed by
+the OOM killer, an engine that fails to load) is replaced on the next
+get_pool() call instead of failing every later OCR until a restart.
+
+The document is written to one temporary file and every page is rasterized
+from that path; handing pdf2image the bytes would copy the whole file to disk
+again for each page.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+import ocr_engines
+
+# -------------------- CONFIG --------------------
+PDF_OCR_WORKERS = int(os.environ.get("PDF_OCR_WORKERS", min(4, os.cpu_count() or 1)))
+RASTER_DPI = 200
+
+
+# -------------------- WORKER SIDE --------------------
+def _warm_worker(engine, tesseract_cmd):
+    if tesseract_cmd:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    ocr_engines.get_engine(engine)
+
+
+def _ocr_page(engine, image_array):
+    return ocr_engines.image_to_text(engine, image_array)
+
+
+# -------------------- POOL --------------------
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _tesseract_cmd():
+    """The parent's tesseract path, which spawned workers would otherwise not see"""
+    try:
+        import pytesseract
+    except ImportError:
+        return None
+    return pytesseract.pytesseract.tesseract_cmd
+
+
+def get_pool(engine, workers=None):
+    """One warm process pool per (engine, worker count), reused across documents; rebuilt if broken"""
+    workers = workers or PDF_OCR_WORKERS
+    tesseract_cmd = _tesseract_cmd() if engine == "tesseract" else None
+    with _pools_lock:
+        pool = _pools.get((engine, workers))
+        if pool is not None and pool._broken:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = None
+        if pool is None:
+            # spawn rather than fork: the Streamlit server process is multi-threaded
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+                initargs=(engine, tesseract_cmd),
+            )
+            _pools[(engine, workers)] = pool
+        return pool
+
+
+@contextmanager
+def spooled_pdf(file_bytes):
+    """Path of a temporary copy of the PDF, written once for all of its pages"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_bytes)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def page_count(pdf_path):
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def rasterize_page(pdf_path, page_number, dpi=RASTER_DPI):
+    """Render a single 1-based page to an RGB array"""
+    image = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)[0]
+    return np.array(image.convert("RGB"))
+
+
+def iter_pdf_ocr(file_bytes, engine="paddle", workers=None, dpi=RASTER_DPI, pages=None):
+    """Yield (page_number, page_count, text) in page order.
+
+    `pages` restricts OCR to the given 1-based page numbers.
+    """
+    workers = workers or PDF_OCR_WORKERS
+    with spooled_pdf(file_bytes) as pdf_path:
+        total = page_count(pdf_path)
+        todo = deque(pages if pages is not None else range(1, total + 1))
+        pool = get_pool(engine, workers)
+        in_flight = deque()
+        try:
+            while todo or in_flight:
+                while todo and len(in_flight) < workers:
+                    number = todo.popleft()
+                    image = rasterize_page(pdf_path, number, dpi)
+                    in_flight.append((number, pool.submit(_ocr_page, engine, image)))
+                    del image
+                number, future = in_flight.popleft()
+                yield number, total, future.result()
+        finally:
+            for _, future in in_flight:
+                future.cancel()
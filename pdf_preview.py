@@ -0,0 +1,176 @@
+"""Low-resolution page thumbnails for previewing uploaded PDFs.
+
+Embedding a PDF as a base64 data: iframe sends the whole document, a third
+larger than the file, over the websocket on every rerun. Instead, previews
+show a few pages at a time as small JPEG thumbnails. A page is rendered only
+the first time it is viewed (one pdftoppm call per page) and is then cached by
+file hash, page and width: in memory for this process and on disk across
+restarts. A rerun sends a few kilobytes instead of the whole document.
+
+Rendering needs the PDF as a file, so each document is written to a private
+temporary directory once, under its hash, and every page is rendered from
+that path; the most recent SOURCE_FILES documents are kept there.
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+# -------------------- CONFIG --------------------
+PREVIEW_DIR = ".preview_cache"
+THUMB_WIDTH = 320
+THUMBS_PER_SHEET = 4
+JPEG_QUALITY = 70
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+DISK_MAX_BYTES = 256 * 1024 * 1024
+SOURCE_FILES = 8
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=PREVIEW_DIR, memory_max_bytes=MEMORY_MAX_BYTES, disk_max_bytes=DISK_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()  # (digest, page, width) -> jpeg bytes
+        self._memory_bytes = 0
+        self._page_counts = {}
+        self._disk_bytes = None  # computed on first disk write
+        self._sources = OrderedDict()  # digest -> path of the spilled PDF
+        self._source_dir = None
+        self._lock = threading.Lock()
+
+    def _path(self, digest, page, width):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-p{page}-w{width}.jpg")
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old)
+
+    def _store(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(data)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._shrink_disk()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_atime, st.st_size, path
+
+    def _shrink_disk(self):
+        """Drop least recently used thumbnails until the directory is 90% of its cap"""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def _source(self, digest, file_bytes):
+        """Path of the PDF on disk, written once per document"""
+        with self._lock:
+            path = self._sources.get(digest)
+            if path is not None and os.path.exists(path):
+                self._sources.move_to_end(digest)
+                return path
+            if self._source_dir is None:
+                self._source_dir = tempfile.mkdtemp(prefix="pdf-preview-")
+                weakref.finalize(self, shutil.rmtree, self._source_dir, True)
+            path = os.path.join(self._source_dir, f"{digest}.pdf")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(file_bytes)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._sources[digest] = path
+            self._sources.move_to_end(digest)
+            while len(self._sources) > SOURCE_FILES:
+                _, old = self._sources.popitem(last=False)
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def page_count(self, digest, file_bytes):
+        count = self._page_counts.get(digest)
+        if count is None:
+            count = self._page_counts[digest] = int(pdfinfo_from_path(self._source(digest, file_bytes))["Pages"])
+        return count
+
+    def thumbnail(self, digest, file_bytes, page, width=THUMB_WIDTH):
+        """JPEG bytes of one 1-based page, rendered only on the first request"""
+        key = (digest, page, width)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        path = self._path(digest, page, width)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used for _shrink_disk
+        except FileNotFoundError:
+            source = self._source(digest, file_bytes)
+            image = convert_from_path(source, first_page=page, last_page=page, size=(width, None))[0]
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY)
+            data = buffer.getvalue()
+            try:
+                self._store(path, data)
+            except OSError:
+                pass  # the disk tier is best effort
+        self._remember(key, data)
+        return data
+
+    def sheet(self, digest, file_bytes, sheet, per_sheet=THUMBS_PER_SHEET, width=THUMB_WIDTH):
+        """[(page_number, jpeg bytes)] for the 1-based `sheet` of `per_sheet` pages"""
+        total = self.page_count(digest, file_bytes)
+        first = (sheet - 1) * per_sheet + 1
+        return [(page, self.thumbnail(digest, file_bytes, page, width))
+                for page in range(first, min(total, first + per_sheet - 1) + 1)]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Process-wide cache shared by every session"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache()
+        return _cache
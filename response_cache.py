@@ -0,0 +1,124 @@
+"""Memoized LLM answers keyed on model, normalized question and document.
+
+Users ask the same questions about the same document ("Summarize this",
+"Explain key points") over and over. The cache stores the finished answer
+under sha256(model, normalized prompt, hash of the document context), with
+LRU eviction and a TTL. One instance is shared by every session in the
+process and is persisted to disk so it survives restarts.
+
+Cached answers are replayed in small pieces through replay(), so callers keep
+their streaming code path and a repeat question renders in milliseconds.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# -------------------- CONFIG --------------------
+CACHE_FILE = ".response_cache.json"
+MAX_ENTRIES = 1000
+TTL_SECONDS = 24 * 60 * 60
+SAVE_EVERY = 20          # write to disk after this many new answers (and at exit)
+REPLAY_CHUNK_CHARS = 24
+
+
+# -------------------- KEYS --------------------
+def normalize_prompt(prompt):
+    return " ".join(prompt.lower().split()).rstrip("?.! ")
+
+
+def context_hash(context):
+    return hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+
+
+def make_key(model, prompt, context=""):
+    raw = f"{model}\0{normalize_prompt(prompt)}\0{context_hash(context)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def replay(text, chunk_chars=REPLAY_CHUNK_CHARS):
+    """Yield a cached answer in small deltas, like a live token stream"""
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars]
+
+
+# -------------------- CACHE --------------------
+class ResponseCache:
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (stored_at, text)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time
+        self._unsaved = 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = (time.time(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            due = self.path and self._unsaved >= SAVE_EVERY
+        if due:
+            try:
+                self.save()
+            except OSError:
+                pass  # persistence is best effort; memory still serves this process
+
+    def save(self):
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                now = time.time()
+                data = [[k, t, text] for k, (t, text) in self._entries.items() if now - t <= self.ttl]
+                self._unsaved = 0
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        now = time.time()
+        with self._lock:
+            for key, stored_at, text in data[-self.max_entries:]:
+                if now - stored_at <= self.ttl:
+                    self._entries[key] = (stored_at, text)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide cache, loaded from disk on first use and saved at exit"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+            _cache.load()
+            atexit.register(_cache.save)
+        return _cache
@@ -0,0 +1,129 @@
+"""Chunking and retrieval over uploaded document text.
+
+Instead of pasting every uploaded document into the prompt, the text is split
+into overlapping chunks once per upload and indexed; each question then pulls
+only the top-k chunks, so prompt size stays bounded however much is uploaded.
+
+BM25Index is an in-memory inverted index with Okapi BM25 scoring. Documents
+can be added and removed one at a time without rebuilding the index.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+# -------------------- CONFIG --------------------
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+TOP_K = 4
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or that the this
+to was were what when where which who why will with you your me my we our do does did can
+""".split())
+
+
+# -------------------- TEXT HELPERS --------------------
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split text into chunks of about `chunk_words` words that overlap by `overlap` words"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+# -------------------- BM25 --------------------
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}                   # chunk_id -> (doc_id, source, position, text)
+        self.chunk_lengths = {}            # chunk_id -> number of tokens
+        self.postings = defaultdict(dict)  # term -> {chunk_id: term frequency}
+        self.doc_chunks = {}               # doc_id -> [chunk_id, ...]
+        self._total_length = 0
+        self._next_id = 0
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_chunks
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add_document(self, doc_id, text, source=None):
+        """Chunk and index one document; re-adding a doc_id replaces it"""
+        if doc_id in self.doc_chunks:
+            self.remove_document(doc_id)
+        ids = []
+        for position, chunk in enumerate(chunk_text(text)):
+            chunk_id = self._next_id
+            self._next_id += 1
+            terms = Counter(tokenize(chunk))
+            for term, tf in terms.items():
+                self.postings[term][chunk_id] = tf
+            length = sum(terms.values())
+            self.chunks[chunk_id] = (doc_id, source or doc_id, position, chunk)
+            self.chunk_lengths[chunk_id] = length
+            self._total_length += length
+            ids.append(chunk_id)
+        self.doc_chunks[doc_id] = ids
+
+    def remove_document(self, doc_id):
+        for chunk_id in self.doc_chunks.pop(doc_id, []):
+            _, _, _, chunk = self.chunks.pop(chunk_id)
+            self._total_length -= self.chunk_lengths.pop(chunk_id)
+            for term in set(tokenize(chunk)):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def search(self, query, k=TOP_K):
+        """Return up to k (score, source, text) tuples, best first"""
+        n = len(self.chunks)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.chunks[cid][1], self.chunks[cid][3]) for cid, score in best]
+
+    def leading_chunks(self, k=TOP_K):
+        """First chunks of each document, for questions with no matching terms ("summarize this")"""
+        picked = []
+        depth = 0
+        while len(picked) < k:
+            added = False
+            for ids in self.doc_chunks.values():
+                if depth < len(ids) and len(picked) < k:
+                    _, source, _, chunk = self.chunks[ids[depth]]
+                    picked.append((0.0, source, chunk))
+                    added = True
+            if not added:
+                break
+            depth += 1
+        return picked
+
+    def context_for(self, query, k=TOP_K):
+        """Prompt-ready text of the k most relevant chunks, grouped by source file"""
+        hits = self.search(query, k) or self.leading_chunks(k)
+        return "\n\n".join(f"--- FILE: {source} ---\n{chunk}" for _, source, chunk in hits)
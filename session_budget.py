@@ -0,0 +1,251 @@
+"""Per-session memory budget for the large values kept in session state.
+
+Streamlit keeps st.session_state in server memory for as long as a session
+lives, and saved chats and extracted document texts only ever grow. A
+SessionBudget holds such values by key and accounts for their approximate
+size. Once a session's resident total passes its budget, the least recently
+used entries are spilled to disk as JSON (.session_spill/<session>/) and
+get() reloads them transparently. An idle session never calls get() or put(),
+so a background sweeper also spills entries nobody has touched for
+SPILL_IDLE_SECONDS. Spill files are deleted when the session's state is
+garbage-collected.
+
+usage_report() lists every live session's resident and spilled bytes. The
+sweeper writes it to USAGE_FILE once a minute, and `python session_budget.py`
+prints that file as a table, so operators can see per-session memory without
+opening the app; usage_text() is a one-line summary for a sidebar.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+# -------------------- CONFIG --------------------
+SESSION_BUDGET_BYTES = int(float(os.environ.get("SESSION_BUDGET_MB", "64")) * 1024 * 1024)
+SPILL_DIR = ".session_spill"
+SPILL_IDLE_SECONDS = float(os.environ.get("SESSION_SPILL_IDLE_SECONDS", "600"))
+SWEEP_INTERVAL = 60
+USAGE_FILE = os.path.join(SPILL_DIR, "usage.json")
+
+
+def estimate_size(value):
+    """Approximate bytes held by a JSON-like value (strings, numbers, lists, dicts)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(v) for v in value)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "size", "last_used", "path")
+
+    def __init__(self, value, size):
+        self.value = value
+        self.size = size
+        self.last_used = time.monotonic()
+        self.path = None  # set while the value lives on disk
+
+
+class SessionBudget:
+    def __init__(self, session_id=None, budget=SESSION_BUDGET_BYTES, spill_dir=SPILL_DIR):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.budget = budget
+        self.dir = os.path.join(spill_dir, self.session_id)
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+        self.spills = 0
+        self.reloads = 0
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._lock = threading.RLock()
+        weakref.finalize(self, shutil.rmtree, self.dir, True)
+        _register(self)
+
+    # ---------- public API ----------
+    def put(self, key, value):
+        with self._lock:
+            self._discard(key)
+            entry = self._entries[key] = _Entry(value, estimate_size(value))
+            self.resident_bytes += entry.size
+            self._enforce(keep=key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry.path is not None:
+                self._reload(entry)
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+            self._enforce(keep=key)
+            return entry.value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self.get(key)
+            self._discard(key)
+            return value
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._discard(key)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def spill_idle(self, max_idle=SPILL_IDLE_SECONDS):
+        """Spill every resident entry not used for `max_idle` seconds"""
+        cutoff = time.monotonic() - max_idle
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.path is None and entry.last_used < cutoff:
+                    self._spill(key, entry)
+
+    def usage(self):
+        with self._lock:
+            return {
+                "session": self.session_id,
+                "resident_bytes": self.resident_bytes,
+                "spilled_bytes": self.spilled_bytes,
+                "budget_bytes": self.budget,
+                "entries": len(self._entries),
+                "spilled_entries": sum(1 for e in self._entries.values() if e.path is not None),
+                "spills": self.spills,
+                "reloads": self.reloads,
+            }
+
+    # ---------- internals ----------
+    def _path(self, key):
+        return os.path.join(self.dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.path is None:
+            self.resident_bytes -= entry.size
+        else:
+            self.spilled_bytes -= entry.size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _spill(self, key, entry):
+        path = self._path(key)
+        os.makedirs(self.dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry.value, f, separators=(",", ":"))
+        entry.value, entry.path = None, path
+        self.resident_bytes -= entry.size
+        self.spilled_bytes += entry.size
+        self.spills += 1
+
+    def _reload(self, entry):
+        with open(entry.path, "r", encoding="utf-8") as f:
+            entry.value = json.load(f)
+        os.remove(entry.path)
+        entry.path = None
+        self.spilled_bytes -= entry.size
+        self.resident_bytes += entry.size
+        self.reloads += 1
+
+    def _enforce(self, keep):
+        """Spill least recently used entries (never `keep`) until back under budget"""
+        for key, entry in list(self._entries.items()):
+            if self.resident_bytes <= self.budget:
+                return
+            if key != keep and entry.path is None:
+                try:
+                    self._spill(key, entry)
+                except (OSError, TypeError, ValueError):
+                    continue  # unwritable or not JSON-serializable: keep it in memory
+
+
+# -------------------- PROCESS-WIDE REGISTRY --------------------
+_budgets = weakref.WeakSet()
+_budgets_lock = threading.Lock()
+_sweeper = None
+
+
+def _sweep():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        with _budgets_lock:
+            budgets = list(_budgets)
+        for budget in budgets:
+            try:
+                budget.spill_idle()
+            except OSError:
+                continue
+        try:
+            write_usage_report()
+        except OSError:
+            pass
+
+
+def _register(budget):
+    global _sweeper
+    with _budgets_lock:
+        _budgets.add(budget)
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep, name="session-spill", daemon=True)
+            _sweeper.start()
+
+
+def session_budget(state, key="_session_budget"):
+    """The SessionBudget stored in a session-state mapping, created on first use"""
+    budget = state.get(key)
+    if budget is None:
+        budget = state[key] = SessionBudget()
+    return budget
+
+
+def usage_report():
+    """Usage of every live session, largest resident first"""
+    with _budgets_lock:
+        budgets = list(_budgets)
+    return sorted((b.usage() for b in budgets), key=lambda u: u["resident_bytes"], reverse=True)
+
+
+def write_usage_report(path=USAGE_FILE):
+    """Snapshot usage_report() to `path` for operators"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "time": time.time(), "sessions": usage_report()}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def usage_text(budget):
+    """One-line summary of this session and the whole process, for a sidebar caption"""
+    mine = budget.usage()
+    report = usage_report()
+    text = f"🧠 Session memory {mine['resident_bytes'] / 2**20:.1f} / {mine['budget_bytes'] / 2**20:.0f} MB"
+    if mine["spilled_entries"]:
+        text += f" ({mine['spilled_entries']} spilled to disk)"
+    total = sum(u["resident_bytes"] for u in report)
+    return text + f" · {len(report)} sessions, {total / 2**20:.1f} MB total"
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else USAGE_FILE
+    with open(path, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    age = time.time() - snapshot["time"]
+    print(f"pid {snapshot['pid']}, {len(snapshot['sessions'])} sessions, written {age:.0f}s ago")
+    print(f"{'session':<34} {'resident MB':>11} {'spilled MB':>10} {'entries':>8} {'spills':>7} {'reloads':>8}")
+    for u in snapshot["sessions"]:
+        print(f"{u['session']:<34} {u['resident_bytes'] / 2**20:>11.1f} {u['spilled_bytes'] / 2**20:>10.1f}"
+              f" {u['entries']:>8} {u['spills']:>7} {u['reloads']:>8}")
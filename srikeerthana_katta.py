@@ -1,14 +1,21 @@
 import streamlit as st
 import pytesseract
 from PIL import Image
-import cv2
-import numpy as np
 import random
 import uuid
 from datetime import datetime
 import requests
-import os
-import tempfile
+
+import ollama_client
+from context_packer import NUM_CTX, ContextPacker
+from extraction_cache import cached_extractor
+from ingest import ingest, ocr_image_in_pool
+from model_warmup import get_warmer
+from ollama_health import CLOSED, get_health_monitor
+from pdf_extract import extract_pdf_pages
+from session_budget import session_budget, usage_text
+from transcript import load_older, older_label, render_html, window
+from upload_buffer import open_upload
 
 # -------------------- PDF & DOC PROCESSING IMPORTS --------------------
 try:
@@ -163,64 +170,55 @@ if "messages" not in st.session_state:
 if "ollama_enabled" not in st.session_state:
     st.session_state["ollama_enabled"] = False
 if "uploaded_files" not in st.session_state:
-    st.session_state["uploaded_files"] = []
+    st.session_state["uploaded_files"] = []  # metadata + preview; full texts live in the budget
+# Document texts are held within a memory budget and spilled to disk when it is exceeded
+budget = session_budget(st.session_state)
 
 # -------------------- DOCUMENT PROCESSING FUNCTIONS --------------------
+EXTRACTION_ERRORS = ("OCR Error", "PDF Processing Error", "DOCX Processing Error",
+                     "TXT Processing Error", "PDF processing unavailable", "DOCX processing unavailable")
+
+def is_extraction_error(text):
+    return text.startswith(EXTRACTION_ERRORS)
+
+@cached_extractor("tesseract-adaptive-psm6", version="2", reject=is_extraction_error)
 def extract_text_from_image(image):
     """Extract text from image using OCR"""
     try:
-        img_array = np.array(image)
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        gray = cv2.medianBlur(gray, 3)
-        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        text = pytesseract.image_to_string(thresh, config='--oem 3 --psm 6')
+        # Adaptive preprocessing + Tesseract run in the OCR process pool, off the GIL
+        text = ocr_image_in_pool(image, psm=6)
         return text.strip() if text.strip() else "No text found in the image."
     except Exception as e:
         return f"OCR Error: {str(e)}"
 
+@cached_extractor("srikeerthana-hybrid-pdf-text", version="1", reject=is_extraction_error)
 def extract_text_from_pdf(pdf_file):
     """Extract text from PDF file"""
     if not PDF_AVAILABLE:
         return "PDF processing unavailable. Please install PyPDF2: pip install pypdf"
     
     try:
-        # Save uploaded file to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Read from temporary file
-        with open(tmp_path, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
+        # Parse straight from the upload buffer; only pages without a usable text layer are OCR'd
+        with open_upload(pdf_file) as f:
             text = ""
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
+            for page_text in extract_pdf_pages(f, ocr_engine="tesseract"):
                 if page_text:
                     text += page_text + "\n"
         
-        # Clean up
-        os.unlink(tmp_path)
-        
         return text.strip() if text.strip() else "No extractable text found in PDF."
     except Exception as e:
         return f"PDF Processing Error: {str(e)}"
 
+@cached_extractor("python-docx-tables", version="1", reject=is_extraction_error)
 def extract_text_from_docx(docx_file):
     """Extract text from DOCX file"""
     if not DOCX_AVAILABLE:
         return "DOCX processing unavailable. Install: pip install python-docx"
     
     try:
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_file:
-            tmp_file.write(docx_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Read from temporary file
-        doc = Document(tmp_path)
+        # Parse straight from the upload buffer, no temp file
+        with open_upload(docx_file) as f:
+            doc = Document(f)
         full_text = []
         
         for paragraph in doc.paragraphs:
@@ -236,13 +234,11 @@ def extract_text_from_docx(docx_file):
         
         text = "\n".join(full_text)
         
-        # Clean up
-        os.unlink(tmp_path)
-        
         return text.strip() if text.strip() else "No text found in DOCX file."
     except Exception as e:
         return f"DOCX Processing Error: {str(e)}"
 
+@cached_extractor("utf8-text-strict", version="1", reject=is_extraction_error)
 def extract_text_from_txt(txt_file):
     """Extract text from TXT file"""
     try:
@@ -293,30 +289,41 @@ def process_uploaded_file(uploaded_file):
 
 # -------------------- OLLAMA FUNCTION --------------------
 def ollama_available():
-    try:
-        r = requests.get("http://localhost:11434/api/tags", timeout=1)
-        return r.status_code == 200
-    except:
-        return False
+    # Cached result of the background probe; never blocks on the network
+    return get_health_monitor().is_available()
+
+def fallback_reply():
+    return random.choice([
+        "Hello! How can I assist today?",
+        "I'm here to help you with whatever you need.",
+        "Got it — let's work on that."
+    ])
 
 def ollama_response(prompt):
+    breaker = get_health_monitor().breaker
+    if not breaker.allow_request():
+        return fallback_reply()
     try:
         data = {
             "model": "llama3.2",
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "options": {"num_ctx": NUM_CTX}
         }
-        r = requests.post("http://localhost:11434/api/generate", json=data, timeout=30)
-        if r.status_code == 200:
-            return r.json().get("response", "No response from Ollama.")
+        timing = get_warmer().start(data["model"])
+        r = ollama_client.post("/api/generate", data, timeout=30)
+        body = r.json()
+        timing.record_response(body)
+        reply = body.get("response", "No response from Ollama.")
+        breaker.record_success()
+        return reply
+    except requests.exceptions.HTTPError:
+        breaker.record_failure()
     except Exception as e:
+        breaker.record_failure()
         return f"Ollama Error: {str(e)}"
     
-    return random.choice([
-        "Hello! How can I assist today?",
-        "I'm here to help you with whatever you need.",
-        "Got it — let's work on that."
-    ])
+    return fallback_reply()
 
 # -------------------- SIDEBAR --------------------
 with st.sidebar:
@@ -362,16 +369,25 @@ with st.sidebar:
         help="Select PDFs, Word documents, text files, or images"
     )
     
-    # Process uploaded files
+    # Process uploaded files, all new files at once
     if uploaded_files:
-        for uploaded_file in uploaded_files:
-            # Check if file is already processed
-            existing_files = [f["name"] for f in st.session_state["uploaded_files"]]
-            if uploaded_file.name not in existing_files:
-                with st.spinner(f"Processing {uploaded_file.name}..."):
-                    file_data = process_uploaded_file(uploaded_file)
-                    st.session_state["uploaded_files"].append(file_data)
-                st.success(f"✅ {uploaded_file.name}")
+        existing_files = {f["name"] for f in st.session_state["uploaded_files"]}
+        new_files = [f for f in uploaded_files if f.name not in existing_files]
+        if new_files:
+            progress = st.progress(0.0, text=f"Processing {len(new_files)} file(s)...")
+
+            def report(index, uploaded_file, file_data, done, total):
+                progress.progress(done / total, text=f"Processed {uploaded_file.name} ({done}/{total})")
+
+            # Results come back in upload order, however long each file takes
+            for file_data in ingest(new_files, process_uploaded_file, on_progress=report):
+                content = file_data.pop("content")
+                file_data["preview"] = content[:500]
+                file_data["chars"] = len(content)
+                budget.put(f"doc:{file_data['name']}", content)
+                st.session_state["uploaded_files"].append(file_data)
+                st.success(f"✅ {file_data['name']}")
+            progress.empty()
     
     # Display uploaded files in sidebar
     if st.session_state["uploaded_files"]:
@@ -382,7 +398,7 @@ with st.sidebar:
                 st.markdown(f"*Size:* {file_data['size']}")
                 st.markdown(f"*Uploaded:* {file_data['timestamp']}")
                 st.markdown("*Content Preview:*")
-                preview_text = file_data['content'][:500] + "..." if len(file_data['content']) > 500 else file_data['content']
+                preview_text = file_data['preview'] + "..." if file_data['chars'] > 500 else file_data['preview']
                 st.text_area("", value=preview_text, height=150, key=f"preview_{file_data['name']}", label_visibility="collapsed")
 
     st.markdown("---")
@@ -390,21 +406,26 @@ with st.sidebar:
         st.session_state["ollama_enabled"] = True
         if not ollama_available():
             st.warning("Ollama is not running on localhost:11434")
+        elif get_health_monitor().breaker.state != CLOSED:
+            st.caption(f"Ollama circuit {get_health_monitor().breaker.state}; using quick replies until it recovers")
+        else:
+            get_warmer().warm("llama3.2", options={"num_ctx": NUM_CTX})
+            st.caption(get_warmer().status_text("llama3.2"))
     else:
         st.session_state["ollama_enabled"] = False
+    st.caption(usage_text(budget))
 
 # -------------------- CHAT UI --------------------
 st.markdown("<div style='height:20px'></div>", unsafe_allow_html=True)
 st.title("Good to see you, srikkeerthana 👋")
 
-# Display messages
-for message in st.session_state["messages"]:
+# Display messages: the newest pages only, each bubble's markup cached by message id
+hidden, shown = window(st.session_state["messages"], st.session_state.get("transcript_pages", 1))
+if hidden:
+    st.button(older_label(hidden), key="load_older", on_click=load_older, args=(st.session_state, "transcript_pages"))
+for message in shown:
     role_class = "user-message" if message["role"] == "user" else "assistant-message"
-    st.markdown(f"""
-    <div class="chat-message {role_class}">
-        {message["content"]}
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(f'<div class="chat-message {role_class}">{render_html(message)}</div>', unsafe_allow_html=True)
 
 # -------------------- UPLOADED DOCUMENTS DISPLAY --------------------
 if st.session_state["uploaded_files"]:
@@ -422,7 +443,7 @@ if st.session_state["uploaded_files"]:
                 </div>
             </div>
             <div class="file-content">
-                {file_data['content'][:300]}{'...' if len(file_data['content']) > 300 else ''}
+                {file_data['preview'][:300]}{'...' if file_data['chars'] > 300 else ''}
             </div>
         </div>
         """, unsafe_allow_html=True)
@@ -433,13 +454,15 @@ prompt = st.chat_input("Ask anything or discuss uploaded documents...")
 if prompt:
     st.session_state["messages"].append({"role": "user", "content": prompt})
     
-    # Include uploaded file content in context
+    # Include uploaded file content in context, shared fairly across files within the token budget
     context = ""
     if st.session_state["uploaded_files"]:
-        context = "\n\nReference from uploaded documents:\n"
-        for file_data in st.session_state["uploaded_files"]:
-            context += f"\n--- {file_data['name']} ({file_data['type']}) ---\n"
-            context += file_data['content'][:800] + ("..." if len(file_data['content']) > 800 else "")
+        packed = ContextPacker(num_ctx=NUM_CTX).pack(
+            prompt,
+            documents=[(f"{f['name']} ({f['type']})", budget.get(f"doc:{f['name']}", "")) for f in st.session_state["uploaded_files"]],
+            overhead="Reference from uploaded documents:"
+        )
+        context = "\n\nReference from uploaded documents:\n\n" + packed.documents_text()
     
     full_prompt = prompt + context
     
@@ -498,6 +521,9 @@ pip install PyPDF2 python-docx pytesseract opencv-python pillow
 # Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki
 # macOS: brew install tesseract
 # Linux: sudo apt-get install tesseract-ocr
+
+# Optional, faster OCR with long-lived in-process Tesseract workers:
+pip install tesserocr
         """)
         
         if not PDF_AVAILABLE:
@@ -0,0 +1,141 @@
+"""Frame-rate-limited rendering of streamed LLM output.
+
+Generators yield deltas (the new text only) instead of the whole reply so
+far. FrameCoalescer collects them in a list buffer and redraws the
+placeholder at most `fps` times per second, so the number of redraws depends
+on how long the answer takes, not how many tokens it has, and nothing sleeps
+between tokens. Because each redraw costs more as the answer grows, the frame
+interval also stretches so redraws never take more than RENDER_BUDGET of the
+elapsed time, which keeps total render time linear in the answer length.
+
+Run `python streaming.py` for a benchmark that compares per-token
+re-rendering with coalesced rendering for 2k-8k token answers.
+"""
+import queue
+import threading
+import time
+
+# -------------------- CONFIG --------------------
+TARGET_FPS = 15
+RENDER_BUDGET = 0.2  # max share of wall time spent redrawing
+IDLE_INTERVAL = 0.1
+
+
+class FrameCoalescer:
+    def __init__(self, render, fps=TARGET_FPS, budget=RENDER_BUDGET, clock=time.perf_counter):
+        self.render = render
+        self.min_interval = 1.0 / fps
+        self.interval = self.min_interval
+        self.budget = budget
+        self.clock = clock
+        self.frames = 0
+        self._parts = []
+        self._text = ""
+        self._last_frame = clock()
+
+    @property
+    def text(self):
+        if self._parts:
+            self._text += "".join(self._parts)
+            self._parts.clear()
+        return self._text
+
+    def push(self, delta):
+        if delta:
+            self._parts.append(delta)
+        now = self.clock()
+        if now - self._last_frame >= self.interval:
+            self.frames += 1
+            self.render(self.text)
+            self._last_frame = self.clock()
+            cost = self._last_frame - now
+            self.interval = max(self.min_interval, cost / self.budget)
+
+    def finish(self):
+        """Render whatever is left and return the complete text"""
+        self.frames += 1
+        self.render(self.text)
+        return self.text
+
+
+_DONE = object()
+
+
+def iter_in_thread(make_iter, idle=None, interval=IDLE_INTERVAL):
+    """Consume make_iter() on a worker thread, calling idle() whenever nothing arrives for `interval`.
+
+    Blocking network reads then never hold up the caller: in a Streamlit
+    script, idle() can touch a placeholder, which is where Streamlit delivers
+    a pending rerun or stop, so a click is handled even while the model is
+    still prefilling. Closing this generator early stops forwarding items;
+    the caller is expected to close the underlying stream.
+    """
+    items = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        try:
+            for item in make_iter():
+                if stop.is_set():
+                    return
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+            return
+        items.put((_DONE, None))
+
+    threading.Thread(target=worker, name="stream-reader", daemon=True).start()
+    try:
+        while True:
+            try:
+                item, error = items.get(timeout=interval)
+            except queue.Empty:
+                if idle is not None:
+                    idle()
+                continue
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+# -------------------- BENCHMARK --------------------
+def _benchmark(tokens, tokens_per_second=40, render_us_per_char=1.0):
+    """Simulated seconds spent rendering an answer of `tokens` tokens.
+
+    Redrawing is modelled as costing `render_us_per_char` per character on
+    screen (markdown parse + websocket payload), on a simulated clock where
+    tokens arrive at `tokens_per_second`.
+    """
+    deltas = [f"tok{i} " for i in range(tokens)]
+    cost = lambda text: len(text) * render_us_per_char / 1e6
+
+    # old path: re-render the whole reply after every token, then sleep 10 ms
+    full, per_token = "", 0.0
+    for delta in deltas:
+        full += delta
+        per_token += cost(full + " 🤖") + 0.01
+
+    now = [0.0]
+    spent = [0.0]
+
+    def render(text):
+        spent[0] += cost(text + " 🤖")
+        now[0] += cost(text + " 🤖")
+
+    coalescer = FrameCoalescer(render, clock=lambda: now[0])
+    for delta in deltas:
+        now[0] += 1.0 / tokens_per_second
+        coalescer.push(delta)
+    coalescer.finish()
+    return per_token, spent[0], coalescer.frames
+
+
+if __name__ == "__main__":
+    print(f"{'tokens':>7} {'per-token (s)':>14} {'coalesced (s)':>14} {'frames':>7} {'ms/token':>9}")
+    for n in (1000, 2000, 4000, 8000, 16000):
+        per_token, coalesced, frames = _benchmark(n)
+        print(f"{n:>7} {per_token:>14.2f} {coalesced:>14.2f} {frames:>7} {coalesced / n * 1e3:>9.3f}")
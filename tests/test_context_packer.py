@@ -0,0 +1,33 @@
+"""ContextPacker keeps every chat turn and only deduplicates document paragraphs."""
+import unittest
+
+from context_packer import ContextPacker
+
+
+class PackHistoryTest(unittest.TestCase):
+    def test_repeated_turn_text_is_kept(self):
+        history = [
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "yes"},
+            {"role": "user", "content": "yes"},
+        ]
+        packed = ContextPacker().pack("and now?", history=history)
+        self.assertEqual(packed.history, history)
+        self.assertFalse(packed.truncated)
+
+    def test_oldest_turns_are_dropped_over_budget(self):
+        history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * 50}
+                   for i in range(40)]
+        packed = ContextPacker(num_ctx=1024, answer_reserve=256).pack("question", history=history)
+        self.assertTrue(packed.truncated)
+        self.assertTrue(packed.history)
+        self.assertEqual(packed.history, history[-len(packed.history):])
+
+    def test_repeated_document_paragraphs_are_sent_once(self):
+        shared = "This paragraph appears in both files."
+        packed = ContextPacker().pack("q", documents=[("a", f"{shared}\n\nonly in a"), ("b", f"{shared}\n\nonly in b")])
+        self.assertEqual(packed.documents_text().count(shared), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
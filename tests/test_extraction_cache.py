@@ -0,0 +1,53 @@
+"""Extractor names must be unique: the on-disk cache is shared by every script."""
+import ast
+import os
+import unittest
+import uuid
+
+from extraction_cache import cached_extractor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _extractor_names(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and getattr(node.func, "id", None) == "cached_extractor"
+                and node.args and isinstance(node.args[0], ast.Constant)):
+            yield node.args[0].value, node.lineno
+
+
+class ExtractorNameTest(unittest.TestCase):
+    def test_names_are_unique_across_scripts(self):
+        seen = {}
+        for filename in sorted(os.listdir(ROOT)):
+            if not filename.endswith(".py"):
+                continue
+            for name, line in _extractor_names(os.path.join(ROOT, filename)):
+                where = f"{filename}:{line}"
+                self.assertNotIn(name, seen, f"{where} reuses extractor name {name!r} from {seen.get(name)}")
+                seen[name] = where
+
+    def test_second_function_with_same_name_is_refused(self):
+        name = f"test-{uuid.uuid4().hex}"
+
+        @cached_extractor(name)
+        def first(source):
+            return "first"
+
+        with self.assertRaises(ValueError):
+            @cached_extractor(name)
+            def second(source):
+                return "second"
+
+    def test_redecorating_the_same_function_is_allowed(self):
+        name = f"test-{uuid.uuid4().hex}"
+        for _ in range(2):  # what a Streamlit rerun does
+            @cached_extractor(name)
+            def extract(source):
+                return "text"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Cancelling a generation against a local stub of Ollama's streaming /api/generate."""
+import json
+import threading
+import time
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ollama_client
+from generation_registry import MAX_GENERATIONS, get_registry
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """Streams NDJSON tokens forever, until the client goes away"""
+
+    disconnected = None  # threading.Event, set per test
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            while True:
+                self.wfile.write(json.dumps({"response": "tok ", "done": False}).encode() + b"\n")
+                self.wfile.flush()
+                time.sleep(0.02)
+        except (BrokenPipeError, ConnectionResetError):
+            self.disconnected.set()
+
+    def log_message(self, *args):
+        pass
+
+
+class CancelGenerationTest(unittest.TestCase):
+    def setUp(self):
+        _StubOllama.disconnected = threading.Event()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.previous_host = ollama_client.OLLAMA_HOST
+        self.previous_retries = ollama_client.RETRIES
+        ollama_client.configure(host=f"http://127.0.0.1:{self.server.server_address[1]}", retries=0)
+
+    def tearDown(self):
+        ollama_client.configure(host=self.previous_host, retries=self.previous_retries)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cancel_disconnects_wakes_reader_and_releases_slot(self):
+        registry = get_registry()
+        request_id = str(uuid.uuid4())
+        streaming = threading.Event()
+        reader_done = threading.Event()
+
+        def read():
+            try:
+                with registry.generation(request_id) as generation:
+                    response = ollama_client.post("/api/generate", {"model": "stub", "prompt": "hi"}, stream=True)
+                    generation.attach(response)
+                    for _ in ollama_client.iter_stream(response):
+                        streaming.set()
+            except Exception:
+                pass  # a cancelled stream may end with a connection error
+            finally:
+                reader_done.set()
+
+        threading.Thread(target=read, daemon=True).start()
+        self.assertTrue(streaming.wait(5), "no tokens arrived from the stub server")
+
+        self.assertTrue(registry.cancel(request_id))
+
+        # Every slot is free again as soon as cancel() returns, before the reader unwinds
+        acquired = 0
+        try:
+            while acquired < MAX_GENERATIONS and registry._slots.acquire(timeout=0):
+                acquired += 1
+            self.assertEqual(acquired, MAX_GENERATIONS)
+        finally:
+            for _ in range(acquired):
+                registry._slots.release()
+
+        self.assertTrue(reader_done.wait(5), "the blocked reader thread did not wake up")
+        self.assertTrue(_StubOllama.disconnected.wait(5), "the server never saw the client disconnect")
+        self.assertNotIn(request_id, registry.active())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""VectorIndex ranking and build_index's fallback, using the deterministic HashingEmbedder."""
+import unittest
+from unittest import mock
+
+import requests
+
+from vector_index import HashingEmbedder, OllamaEmbedder, VectorIndex, build_index
+
+TEXTS = [
+    "the invoice total is due within thirty days of delivery",
+    "pedestrian crossings near schools must be signalled and lit",
+    "complaints are answered within fourteen working days",
+    "the warranty covers parts and labour for two years",
+]
+
+
+class VectorIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = VectorIndex(HashingEmbedder())
+        self.index.add_texts(TEXTS)
+
+    def test_search_ranks_best_match_first_and_limits_to_k(self):
+        hits = self.index.search("when is the invoice total due", k=2)
+        self.assertEqual(len(hits), 2)
+        self.assertEqual(hits[0][1], TEXTS[0])
+        self.assertGreaterEqual(hits[0][0], hits[1][0])
+
+    def test_search_scores_are_sorted_descending(self):
+        scores = [score for score, _ in self.index.search("crossings near schools", k=len(TEXTS))]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(len(scores), len(TEXTS))
+
+    def test_k_larger_than_index(self):
+        self.assertEqual(len(self.index.search("warranty", k=50)), len(TEXTS))
+
+    def test_context_for_restores_document_order(self):
+        context = self.index.context_for("warranty parts labour invoice total", k=2)
+        parts = context.split("\n\n...\n\n")
+        self.assertEqual(parts, sorted(parts, key=TEXTS.index))
+
+    def test_growth_keeps_earlier_rows(self):
+        index = VectorIndex(HashingEmbedder())
+        for i in range(100):
+            index.add_texts([f"document number {i} about topic {i}"])
+        self.assertEqual(index.search("document number 7 about topic 7", k=1)[0][1], "document number 7 about topic 7")
+
+
+class BuildIndexTest(unittest.TestCase):
+    def test_falls_back_to_hashing_when_ollama_is_unavailable(self):
+        with mock.patch.object(OllamaEmbedder, "embed", side_effect=requests.exceptions.ConnectionError):
+            index = build_index(" ".join(TEXTS))
+        self.assertIsInstance(index.embedder, HashingEmbedder)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.search("invoice")[0][1], " ".join(TEXTS))
+
+    def test_explicit_embedder_errors_propagate(self):
+        embedder = OllamaEmbedder()
+        with mock.patch.object(OllamaEmbedder, "embed", side_effect=requests.exceptions.ConnectionError):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                build_index("some text", embedder=embedder)
+
+
+if __name__ == "__main__":
+    unittest.main()
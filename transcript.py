@@ -0,0 +1,142 @@
+"""Paged rendering of long chat transcripts.
+
+Looping over every message with st.chat_message / st.markdown rebuilds and
+resends the whole conversation on every rerun, so each keystroke in a long
+chat costs time proportional to its history. The scripts render only
+window(): the newest `pages` pages of PAGE_SIZE messages. A "load older"
+button (with load_older() as its on_click) adds one page at a time, so a
+rerun costs the same whether a chat holds thirty messages or three thousand.
+
+Scripts that build their own HTML for a message (srikeerthana_katta's styled
+bubbles) go through render_html(), which converts the message's markdown once
+and caches the markup by message id, a digest of role and content. A message
+that has not changed is never re-parsed; one that has (a reply still being
+streamed) simply gets a new id.
+
+Run `python transcript.py` for a benchmark of a rerun against history length.
+"""
+import hashlib
+import html
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import markdown as _markdown
+except ImportError:
+    _markdown = None
+
+# -------------------- CONFIG --------------------
+PAGE_SIZE = int(os.environ.get("TRANSCRIPT_PAGE_SIZE", "20"))
+MARKUP_CACHE_ENTRIES = 2048
+MARKDOWN_EXTENSIONS = ["fenced_code", "tables", "nl2br"]
+
+
+def message_id(message):
+    """Stable id of a message's role and content"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(message.get("role", "")).encode())
+    digest.update(b"\0")
+    digest.update(str(message.get("content", "")).encode())
+    return digest.hexdigest()
+
+
+def window(messages, pages=1, page_size=PAGE_SIZE):
+    """(hidden, shown): the number of older messages left out and the newest `pages` pages"""
+    hidden = max(0, len(messages) - pages * page_size)
+    return hidden, messages[hidden:]
+
+
+def load_older(state, key):
+    """on_click callback for a "load older" button: show one more page"""
+    state[key] = state.get(key, 1) + 1
+
+
+def older_label(hidden, page_size=PAGE_SIZE):
+    return f"⬆️ Load {min(hidden, page_size)} older messages ({hidden} hidden)"
+
+
+def markdown_to_html(text):
+    if _markdown is not None:
+        return _markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+    return html.escape(text).replace("\n", "<br>")
+
+
+class MarkupCache:
+    def __init__(self, max_entries=MARKUP_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # message id -> html, least recently used first
+        self._lock = threading.Lock()
+
+    def render(self, message):
+        """HTML for a message's markdown content, converted only the first time it is seen"""
+        key = message_id(message)
+        with self._lock:
+            markup = self._entries.get(key)
+            if markup is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return markup
+        markup = markdown_to_html(str(message.get("content", "")))
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = markup
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return markup
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_markup_cache():
+    """Process-wide cache shared by every session"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MarkupCache()
+        return _cache
+
+
+def render_html(message):
+    return get_markup_cache().render(message)
+
+
+# -------------------- BENCHMARK --------------------
+def _synthetic_history(length):
+    reply = "Here is a summary:\n\n* first point\n* second point\n\n```python\nprint('hello')\n```\n" * 4
+    return [
+        {"role": "user", "content": f"Question {i}: what does section {i} say?"} if i % 2 == 0
+        else {"role": "assistant", "content": f"Answer {i}. {reply}"}
+        for i in range(length)
+    ]
+
+
+def _rerun_all(messages):
+    """The previous loop: format every message on every rerun"""
+    return [markdown_to_html(m["content"]) for m in messages]
+
+
+def _rerun_paged(messages, cache):
+    _, shown = window(messages)
+    return [cache.render(m) for m in shown]
+
+
+if __name__ == "__main__":
+    import time
+
+    print(f"markdown package: {'yes' if _markdown is not None else 'no (escaped text)'}, page size {PAGE_SIZE}")
+    print(f"{'messages':>9} {'all ms':>9} {'paged ms':>9}")
+    for length in (50, 500, 5000):
+        messages = _synthetic_history(length)
+        cache = MarkupCache()
+        _rerun_paged(messages, cache)  # the first rerun fills the cache
+        timings = []
+        for rerun in (lambda: _rerun_all(messages), lambda: _rerun_paged(messages, cache)):
+            start = time.perf_counter()
+            rerun()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{length:>9} {timings[0]:>9.1f} {timings[1]:>9.1f}")
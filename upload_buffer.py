@@ -0,0 +1,129 @@
+"""Parse uploads straight from memory instead of through named temp files.
+
+Writing getvalue() to a NamedTemporaryFile, reopening it and unlinking it
+costs a full write of the document to disk per parse, and leaves the file
+behind whenever parsing raises before the unlink. The upload's bytes are
+already in memory, so open_upload() hands parsers an io.BytesIO built on
+that bytes object, which CPython shares instead of copying until something
+writes to it. Heap use is the same either way; what goes away is the disk
+write and the leftover file.
+
+Run `python upload_buffer.py [file ...]` for a latency, heap and disk-write
+benchmark against the temp-file approach.
+"""
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def upload_bytes(upload):
+    """The upload's content as a bytes-like object, without copying where possible"""
+    if isinstance(upload, (bytes, bytearray, memoryview)):
+        return upload
+    if hasattr(upload, "getvalue"):
+        return upload.getvalue()
+    upload.seek(0)
+    return upload.read()
+
+
+@contextmanager
+def open_upload(upload):
+    """Yield a seekable binary stream over an upload's bytes, without copying them or touching disk"""
+    stream = io.BytesIO(upload_bytes(upload))
+    try:
+        yield stream
+    finally:
+        stream.close()
+
+
+# -------------------- BENCHMARK --------------------
+def _temp_file_flow(upload, parse):
+    """The previous srikeerthana_katta path: parsers read the reopened temp file itself"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".bin") as tmp_file:
+        tmp_file.write(upload.getvalue())
+        tmp_path = tmp_file.name
+    with open(tmp_path, "rb") as f:
+        result = parse(f)
+    os.unlink(tmp_path)
+    return result
+
+
+def _in_memory_flow(upload, parse):
+    with open_upload(upload) as stream:
+        return parse(stream)
+
+
+def _read_through(stream):
+    """Stand-in parser: touch every byte the way a sequential reader would"""
+    import zlib
+
+    crc = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            return crc
+        crc = zlib.crc32(chunk, crc)
+
+
+def _bytes_written():
+    """Bytes this process has passed to write() so far (Linux /proc), or None"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _measure(flow, upload, parse, repeat=3):
+    import time
+    import tracemalloc
+
+    best = float("inf")
+    written_before = _bytes_written()
+    tracemalloc.start()
+    for _ in range(repeat):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        flow(upload, parse)
+        best = min(best, time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    written_after = _bytes_written()
+    written = None if written_before is None else (written_after - written_before) / repeat
+    return best, peak, written
+
+
+def _benchmark(samples):
+    print(f"{'upload':<28} {'MiB':>7} {'path':<10} {'seconds':>8} {'peak MiB':>9} {'written MiB':>12}")
+    for name, upload, parse in samples:
+        size = len(upload.getvalue()) / 2**20
+        for label, flow in (("temp file", _temp_file_flow), ("in memory", _in_memory_flow)):
+            seconds, peak, written = _measure(flow, upload, parse)
+            written = "n/a" if written is None else f"{written / 2**20:.1f}"
+            print(f"{name[:28]:<28} {size:>7.1f} {label:<10} {seconds:>8.3f} {peak / 2**20:>9.1f} {written:>12}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    samples = []
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            upload = io.BytesIO(f.read())
+        if path.lower().endswith(".pdf"):
+            from pdf_extract import PdfReader
+            parse = lambda stream: [page.extract_text() for page in PdfReader(stream).pages]
+        elif path.lower().endswith(".docx"):
+            from docx import Document
+            parse = lambda stream: [p.text for p in Document(stream).paragraphs]
+        else:
+            parse = _read_through
+        samples.append((os.path.basename(path), upload, parse))
+    if not samples:
+        for mib in (1, 16, 128):
+            samples.append((f"synthetic {mib} MiB", io.BytesIO(os.urandom(mib * 2**20)), _read_through))
+    _benchmark(samples)
@@ -0,0 +1,121 @@
+"""Embedding-based semantic retrieval over a document's chunks.
+
+Chunks (see retrieval.chunk_text) are embedded once at upload time, in
+batches, and stored L2-normalized in one contiguous float32 matrix. A query is
+a single matrix-vector product followed by argpartition, so lookups stay cheap
+even for long documents.
+
+OllamaEmbedder calls Ollama's /api/embed endpoint. HashingEmbedder is a
+deterministic, dependency-free stand-in (feature hashing of words and word
+pairs) used in tests and as a fallback when no embedding model is available.
+"""
+import hashlib
+
+import numpy as np
+import requests
+
+import ollama_client
+from retrieval import TOP_K, chunk_text, tokenize
+
+# -------------------- CONFIG --------------------
+EMBED_MODEL = "nomic-embed-text"
+EMBED_BATCH_SIZE = 32
+
+
+# -------------------- EMBEDDERS --------------------
+class OllamaEmbedder:
+    def __init__(self, model=EMBED_MODEL, batch_size=EMBED_BATCH_SIZE, timeout=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def embed(self, texts):
+        """Return a (len(texts), dim) float32 array"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            vectors.extend(ollama_client.embed(self.model, batch, timeout=self.timeout))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class HashingEmbedder:
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                out[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return out
+
+
+# -------------------- INDEX --------------------
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.texts = []
+        self._matrix = None  # capacity grows by doubling; rows [:len(texts)] are live
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add_texts(self, texts):
+        if not texts:
+            return
+        vectors = _normalize(self.embedder.embed(list(texts)).astype(np.float32, copy=False))
+        n, needed = len(self.texts), len(self.texts) + len(texts)
+        if self._matrix is None:
+            self._matrix = np.empty((max(needed, 64), vectors.shape[1]), dtype=np.float32)
+        elif needed > self._matrix.shape[0]:
+            grown = np.empty((max(needed, 2 * self._matrix.shape[0]), self._matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self._matrix[:n]
+            self._matrix = grown
+        self._matrix[n:needed] = vectors
+        self.texts.extend(texts)
+
+    def add_document(self, text):
+        self.add_texts(chunk_text(text))
+
+    def search(self, query, k=TOP_K):
+        """Return up to k (cosine score, chunk text) pairs, best first"""
+        n = len(self.texts)
+        if not n:
+            return []
+        q = _normalize(self.embedder.embed([query]).astype(np.float32, copy=False))[0]
+        scores = self._matrix[:n] @ q
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.texts[i]) for i in top]
+
+    def context_for(self, query, k=TOP_K):
+        """The k most relevant chunks, restored to document order"""
+        hits = self.search(query, k)
+        order = {text: i for i, text in enumerate(self.texts)}
+        return "\n\n...\n\n".join(text for _, text in sorted(hits, key=lambda hit: order[hit[1]]))
+
+
+def build_index(text, embedder=None):
+    """Index a document with Ollama embeddings, falling back to HashingEmbedder when unavailable"""
+    index = VectorIndex(embedder or OllamaEmbedder())
+    try:
+        index.add_document(text)
+    except (requests.exceptions.RequestException, KeyError, ValueError):
+        if embedder is not None:
+            raise
+        index = VectorIndex(HashingEmbedder())
+        index.add_document(text)
+    return index